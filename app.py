@@ -1,9 +1,19 @@
-from typing import Union, List
-from PyQt5 import QtCore, QtGui, QtWidgets
+from startup import mark as mark_startup, phase  # First, to time the imports below.
+from typing import Union, List, Tuple
+
+with phase("import PyQt5"):
+    from PyQt5 import QtCore, QtGui, QtWidgets
 from textwrap import wrap
-from meta import res_rc  # Resources used by PyQt in icon and mic button
-from speech_recognition import Microphone, Recognizer
-from pickle import load as pkload
+from threading import Thread
+from time import time
+
+# Resources used by PyQt in icon and mic button, Qt maps the file instead of
+# us keeping a copy of the images in a Python module.
+with phase("register meta/res.rcc"):
+    if not QtCore.QResource.registerResource("meta/res.rcc"):
+        raise FileNotFoundError("Couldn't load meta/res.rcc, see meta/res.qrc.")
+with phase("import speech_recognition"):
+    from speech_recognition import Microphone, Recognizer
 
 
 class MainWindow(QtWidgets.QMainWindow):
@@ -77,8 +87,16 @@ class ChatBox(QtWidgets.QFrame):
     pop-up animation. This class cache messages upto 25 messages.
     """
 
+    # Emitting a function from any thread runs it on the GUI thread, Eg. the
+    # storage callbacks that update a frame once a note is saved.
+    run_on_gui = QtCore.pyqtSignal(object)
+    # Carries a page of older messages from the history thread, see `load_older`.
+    older_loaded = QtCore.pyqtSignal(object)
+
     def __init__(self, parent: QtWidgets.QWidget):
         super().__init__(parent)
+        self.run_on_gui.connect(lambda func: func())
+        self.older_loaded.connect(self._add_older_msgs)
 
         # Here msgs and anims are just the cache list of message and animations.
         self.msgs: List[QtWidgets.QLabel] = []
@@ -86,6 +104,76 @@ class ChatBox(QtWidgets.QFrame):
         self.chatvertlay = QtWidgets.QVBoxLayout(self)
         self.msgfnt = QtGui.QFont()
         self.msgfnt.setPointSize(12)
+        # The `Storage` that saves the messages, see `open_history`.
+        self.history = None
+        # The messages shown before the history was opened, saved then.
+        self._unsaved = []
+        self._loading_older = False
+        self._history_left = True
+
+    def open_history(self, storage) -> None:
+        """
+        Saves the messages from now on in the storage's history, and shows
+        the last page of it.
+        """
+        self.history = storage
+        self._add_older_msgs(storage.history_page())
+        for message, from_user, text in self._unsaved:
+            self._save_msg(message, from_user, text)
+        self._unsaved = []
+
+    def load_older(self) -> None:
+        """
+        Fetches the page of history before the oldest message shown on a
+        background thread, the messages are added once it is back.
+        """
+        if self.history is None or self._loading_older or not self._history_left:
+            return
+        # The frames and the messages still being saved have no id.
+        ids = [msg.history_id for msg in self.msgs if getattr(msg, "history_id", None)]
+        if self.msgs and not ids:
+            return
+        self._loading_older = True
+        before = ids[0] if ids else None
+        Thread(
+            target=lambda: self.older_loaded.emit(self.history.history_page(before)),
+            daemon=True,
+        ).start()
+
+    @QtCore.pyqtSlot(object)
+    def _add_older_msgs(self, page: List[Tuple[int, bool, str, float]]):
+        # The page is newest first, every message goes on the top.
+        self._loading_older = False
+        if not page:
+            self._history_left = False
+        for msg_id, from_user, text, _ in page:
+            if from_user:
+                message, align = (
+                    self._user_label(text),
+                    QtCore.Qt.AlignmentFlag.AlignRight,
+                )
+            else:
+                message, align = (
+                    self._bot_label(text),
+                    QtCore.Qt.AlignmentFlag.AlignLeft,
+                )
+            message.history_id = msg_id
+            message.setFont(self.msgfnt)
+            message.setMaximumHeight(message.text().count("\n") * 31 + 31)
+            self.msgs.insert(0, message)
+            self.chatvertlay.insertWidget(0, message, 0, align)
+
+    def _save_msg(self, message: QtWidgets.QLabel, from_user: bool, text: str):
+        if self.history is None:
+            self._unsaved.append((message, from_user, text))
+            return
+
+        def saved(msg_id, error):
+            # This runs on the storage writer thread.
+            if error is None:
+                self.run_on_gui.emit(lambda: setattr(message, "history_id", msg_id))
+
+        self.history.add_message(from_user, text, time(), callback=saved)
 
     def append_msg(self, message):
         self.msgs.append(message)
@@ -94,6 +182,23 @@ class ChatBox(QtWidgets.QFrame):
             msg = self.msgs.pop(0)
             msg.setParent(None)
             del msg
+            # It is still in the history to scroll back to.
+            self._history_left = self.history is not None
+
+    def _user_label(self, text: str) -> QtWidgets.QLabel:
+        text = text.strip()
+        text = "\n".join(wrap(text, 80))
+        message = QtWidgets.QLabel(text, self)
+        message.setStyleSheet("border-top-right-radius:0px")
+        return message
+
+    def _bot_label(self, text: str) -> QtWidgets.QLabel:
+        text = "\n".join(
+            wrap(text, 80, break_long_words=False, replace_whitespace=False)
+        )
+        message = QtWidgets.QLabel(text, self)
+        message.setStyleSheet("border-top-left-radius:0px")
+        return message
 
     @QtCore.pyqtSlot(str)
     def add_user_msg(self, text: str):
@@ -102,10 +207,8 @@ class ChatBox(QtWidgets.QFrame):
         Args:
             text (str): The text that will show up as user message.
         """
-        text = text.strip()
-        text = "\n".join(wrap(text, 80))
-        message = QtWidgets.QLabel(text, self)
-        message.setStyleSheet("border-top-right-radius:0px")
+        message = self._user_label(text)
+        self._save_msg(message, True, text)
         self._add_msg_label(message, QtCore.Qt.AlignmentFlag.AlignRight)
 
     @QtCore.pyqtSlot(str)
@@ -116,11 +219,8 @@ class ChatBox(QtWidgets.QFrame):
         Args:
             text (str): The text to set for QLabel
         """
-        text = "\n".join(
-            wrap(text, 80, break_long_words=False, replace_whitespace=False)
-        )
-        message = QtWidgets.QLabel(text, self)
-        message.setStyleSheet("border-top-left-radius:0px")
+        message = self._bot_label(text)
+        self._save_msg(message, False, text)
         self._add_msg_label(message, QtCore.Qt.AlignmentFlag.AlignLeft)
 
     @QtCore.pyqtSlot(QtWidgets.QLabel, QtCore.Qt.AlignmentFlag)
@@ -136,7 +236,8 @@ class ChatBox(QtWidgets.QFrame):
     @QtCore.pyqtSlot(QtWidgets.QFrame)
     def add_bot_frame(self, frame: QtWidgets.QFrame):
         """
-        Adds a QFrame(Container) as a bot's message.
+        Adds a QFrame(Container) as a bot's message. Frames show live data,
+        so they are not saved in the history.
 
         Args:
             frame (QtWidgets.QFrame): QFrame That will be added.
@@ -244,7 +345,8 @@ class App:
         self.icon.setFixedSize(QtCore.QSize(30, 30))
         self.icon.setCursor(QtGui.QCursor(QtCore.Qt.SizeAllCursor))
         self.icon.setStyleSheet("border-radius:0px;")
-        # Below `:/tensor` belongs to the resource py file we imported at the top. see line-4
+        # Below `:/tensor` is a prefix of meta/res.qrc, compiled to meta/res.rcc and
+        # registered with `QResource.registerResource` at the top.
         # The images that show up on my GUI are all made by me in blender which is an Open source program.
         # So no copyright issues :)
         self.icon.setPixmap(QtGui.QPixmap(":/tensor/meta/tensor(nonglow).png"))
@@ -385,8 +487,20 @@ class App:
     def add_ui_logic(self):
         self.cross.clicked.connect(self.app.close)
         self.minim.clicked.connect(self.app.showMinimized)
-        self.chatscroll.verticalScrollBar().rangeChanged.connect(
-            lambda min, max: self.chatscroll.verticalScrollBar().setSliderPosition(max)
+        bar = self.chatscroll.verticalScrollBar()
+        # How far the view is from the newest message. It is kept when the
+        # messages grow, so the older messages added on the top don't move
+        # the view, while at the bottom it follows the new messages.
+        self.from_bottom = 0
+
+        def scrolled(value):
+            self.from_bottom = bar.maximum() - value
+            if value == bar.minimum() and bar.maximum() > 0:
+                self.chatbox.load_older()
+
+        bar.valueChanged.connect(scrolled)
+        bar.rangeChanged.connect(
+            lambda min, max: bar.setSliderPosition(max - self.from_bottom)
         )
 
         def do_send():
@@ -401,8 +515,21 @@ class App:
                 WARNED = True
                 return
             self.msgedit.setText("")
-            self.msgedit.setDisabled(True)
+            self.from_bottom = 0
             self.chatbox.add_user_msg(msg)
+            if LOAD_ERROR is not None:
+                # It won't load any more, don't keep the message for it.
+                self.chatbox.add_bot_msg(
+                    f"Sorry, I'm not available, I couldn't start: {LOAD_ERROR}"
+                )
+                return
+            if CHATBOT is None:
+                # Still warming up, the messages are answered once it's ready.
+                if not self.pending:
+                    self.chatbox.add_bot_msg("I'm still waking up, give me a moment.")
+                self.pending.append(msg)
+                return
+            self.msgedit.setDisabled(True)
             run_chatbot(msg)
 
         def run_chatbot(msg):
@@ -417,9 +544,23 @@ class App:
             self.cb_thread.start()
 
         def re_enable_stage():
+            mark_startup("first answer")
+            if self.pending:
+                run_chatbot(self.pending.pop(0))
+                return
             self.msgedit.setDisabled(False)
             self.msgedit.setFocus()
 
+        def answer_pending():
+            # Called once the chatbot is loaded.
+            if self.pending:
+                self.msgedit.setDisabled(True)
+                run_chatbot(self.pending.pop(0))
+
+        # The messages sent while the chatbot was loading.
+        self.pending: List[str] = []
+        self.answer_pending = answer_pending
+
         self.msgedit.returnPressed.connect(do_send)
         self.micbut.setShortcut(QtGui.QKeySequence("Ctrl+Shift+A"))
 
@@ -451,7 +592,31 @@ class App:
                 pass
 
         self.app.closing.connect(terminate_threads)
-        self.app.closing.connect(CHATBOT.close)
+        self.app.closing.connect(lambda: CHATBOT is not None and CHATBOT.close())
+
+
+class Loader_Worker(QtCore.QObject):
+    """
+    This worker loads the chatbot, that is the model, the vocabulary, the
+    intents and the database. It takes seconds, so it runs on the startup
+    pool while the window is made and shown, the signals hand the chatbot
+    over to the GUI thread.
+    """
+
+    loaded = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(str)
+
+    def run(self, chatbox: ChatBox):
+        try:
+            with phase("import chatbot"):
+                from chatbot import ChatBot
+            with phase("ChatBot()"):
+                chatbot = ChatBot(chatbox)
+        except Exception as err:
+            print(repr(err))
+            self.failed.emit(str(err))
+            return
+        self.loaded.emit(chatbot)
 
 
 class Chatbot_Worker(QtCore.QObject):
@@ -501,34 +666,98 @@ class SpeechRecog_Worker(QtCore.QObject):
 
 if __name__ == "__main__":
     import sys
-    from chatbot import ChatBot
+    from importlib import import_module
+    from os import environ
+    from orchestrator import Orchestrator
 
     WARNED = False
-    API_KEY, API_LOC = pkload(open("data/API.pkl", "rb"))
-    app = QtWidgets.QApplication(sys.argv)
-    # Adding The style sheet for QScrollBar Object because of CSS Parent issue.
-    # Simply if I will add it in Scroll Area it won't effect the Scrollbar of the area.
-    app.setStyleSheet(
-        "QScrollBar:vertical {border:none;background:rgb(45, 45, 68);width:14px;margin:10px 0 10px 0;}\n"
-        "QScrollBar::handle:vertical {background-color: rgb(80, 80, 122);min-height: 20px;border-radius: 7px;}\n"
-        "QScrollBar::handle:vertical:hover{background-color: rgb(32, 214, 255);}\n"
-        "QScrollBar::handle:vertical:pressed {background-color: rgb(0, 132, 255);}\n"
-        "QScrollBar::sub-line:vertical {border: none;background-color: rgb(59, 59, 90);height: 10px;subcontrol-position: top;subcontrol-origin: margin;}\n"
-        "QScrollBar::sub-line:vertical:hover {background-color: rgb(32, 214, 255);}\n"
-        "QScrollBar::sub-line:vertical:pressed {background-color: rgb(0, 132, 255);}\n"
-        "QScrollBar::add-line:vertical {border: none;background-color: rgb(59, 59, 90);height: 10px;subcontrol-position: bottom;subcontrol-origin: margin;}\n"
-        "QScrollBar::add-line:vertical:hover {background-color: rgb(32, 214, 255);}\n"
-        "QScrollBar::add-line:vertical:pressed {background-color: rgb(0, 132, 255);}\n"
-        "QScrollBar::up-arrow:vertical, QScrollBar::down-arrow:vertical {background: none;}\n"
-        "QScrollBar::add-page:vertical, QScrollBar::sub-page:vertical {background: none;}\n"
+
+    def import_tensorflow():
+        # Disabling warning/logging of Tensorflow, before it is imported.
+        environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+        import_module("tensorflow.keras.models")
+
+    def make_window(app):
+        # Adding The style sheet for QScrollBar Object because of CSS Parent issue.
+        # Simply if I will add it in Scroll Area it won't effect the Scrollbar of the area.
+        app.setStyleSheet(
+            "QScrollBar:vertical {border:none;background:rgb(45, 45, 68);width:14px;margin:10px 0 10px 0;}\n"
+            "QScrollBar::handle:vertical {background-color: rgb(80, 80, 122);min-height: 20px;border-radius: 7px;}\n"
+            "QScrollBar::handle:vertical:hover{background-color: rgb(32, 214, 255);}\n"
+            "QScrollBar::handle:vertical:pressed {background-color: rgb(0, 132, 255);}\n"
+            "QScrollBar::sub-line:vertical {border: none;background-color: rgb(59, 59, 90);height: 10px;subcontrol-position: top;subcontrol-origin: margin;}\n"
+            "QScrollBar::sub-line:vertical:hover {background-color: rgb(32, 214, 255);}\n"
+            "QScrollBar::sub-line:vertical:pressed {background-color: rgb(0, 132, 255);}\n"
+            "QScrollBar::add-line:vertical {border: none;background-color: rgb(59, 59, 90);height: 10px;subcontrol-position: bottom;subcontrol-origin: margin;}\n"
+            "QScrollBar::add-line:vertical:hover {background-color: rgb(32, 214, 255);}\n"
+            "QScrollBar::add-line:vertical:pressed {background-color: rgb(0, 132, 255);}\n"
+            "QScrollBar::up-arrow:vertical, QScrollBar::down-arrow:vertical {background: none;}\n"
+            "QScrollBar::add-page:vertical, QScrollBar::sub-page:vertical {background: none;}\n"
+        )
+        root = MainWindow()
+        root.setWindowIcon(QtGui.QIcon("meta/icon.ico"))
+        main_app = App(root)
+        # Connected before the chatbot can be loaded, it needs the window.
+        loader.loaded.connect(chatbot_loaded)
+        loader.failed.connect(chatbot_failed)
+        return main_app
+
+    def chatbot_loaded(chatbot):
+        global CHATBOT, API_KEY, API_LOC
+        CHATBOT = chatbot
+        API_KEY = CHATBOT.funcs.storage.settings.get("speech_api_key")
+        API_LOC = CHATBOT.funcs.storage.settings.get("speech_api_location")
+        main_app.chatbox.open_history(CHATBOT.funcs.storage)
+        mark_startup("chatbot ready")
+        main_app.answer_pending()
+
+    def chatbot_failed(err):
+        global LOAD_ERROR
+        LOAD_ERROR = err
+        # Those were told to wait, they won't be answered.
+        main_app.pending.clear()
+        main_app.chatbox.add_bot_msg(f"Sorry, I couldn't start: {err}")
+
+    # Making CHATBOT variable global to not block main thread while getting response,
+    # it is `None` until the `Loader_Worker` is done. `LOAD_ERROR` is why it
+    # failed, if it did.
+    CHATBOT = None
+    LOAD_ERROR = None
+    API_KEY = API_LOC = None
+    loader = Loader_Worker()
+    # The window is made on this thread while TensorFlow and NLTK are
+    # imported side by side on the pool, the chatbot is loaded once they
+    # are and the chatbox exists, long before the user types anything.
+    init = Orchestrator("app")
+    init.add("QApplication", lambda: QtWidgets.QApplication(sys.argv), gui=True)
+    init.add("window", make_window, after=("QApplication",), gui=True)
+    init.add(
+        "setupUi",
+        lambda main_app: main_app.setupUi().add_ui_logic(),
+        after=("window",),
+        gui=True,
+    )
+    init.add("import tensorflow", import_tensorflow)
+    init.add("import nltk", lambda: import_module("nltk.stem.lancaster"))
+    init.add(
+        "import chatbot", lambda _: import_module("chatbot"), after=("import nltk",)
+    )
+    # Run even if the imports failed, `Loader_Worker` then shows the error.
+    # TensorFlow may well be missing if the model runs on another backend.
+    init.add(
+        "ChatBot()",
+        lambda _, __, main_app: loader.run(main_app.chatbox),
+        after=("import chatbot", "import tensorflow", "window"),
+        always=True,
     )
-    root = MainWindow()
-    root.setWindowIcon(QtGui.QIcon("meta/icon.ico"))
-    main_app = App(root)
-    # Making CHATBOT variable global to not block main thread while getting response
-    CHATBOT = ChatBot(main_app.chatbox)
-    main_app.setupUi().add_ui_logic()
+    init.start()
+    init.run_gui()
+    app = init.result("QApplication")
+    main_app = init.result("window")
+    root = main_app.app
     root.show()
     root.raise_()
     root.activateWindow()
+    # Runs once the event loop has painted the window.
+    QtCore.QTimer.singleShot(0, lambda: mark_startup("first paint"))
     sys.exit(app.exec_())
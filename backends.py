@@ -0,0 +1,199 @@
+"""
+The ways the chat bot can run its model, by name. Each is a `Backend` that
+loads its own file of the model and predicts a batch of bags of words:
+
+    keras       the trained model, with TensorFlow
+    int8        the int8 copy of `python -m quantize`, with numpy
+    float16     the float16 copy of `python -m quantize`, with numpy
+    tflite      the copy of `python -m tflite_model`, with TFLite
+
+`TENSORBOT_MODEL` picks one. The default "auto" loads all of them whose
+file is there, times them on this machine and keeps the fastest whose
+answers agree with Keras's, see `choose_backend`.
+"""
+
+from os import environ
+from os.path import exists
+from statistics import median
+from time import perf_counter
+from typing import Dict, List, Optional, Type
+import numpy as np
+from quantize import QUANTIZED_PATHS, QuantizedModel
+from startup import chose_backend
+from tflite_model import TFLITE_PATH, TFLITE_THREADS, TFLiteModel
+from vocab import MODEL_PATH
+
+BACKEND = environ.get("TENSORBOT_MODEL", "auto")
+# The calls each backend is timed over by "auto", after one to warm it up.
+AUTO_CALLS = 20
+BACKENDS: Dict[str, Type["Backend"]] = {}
+
+
+def register(name: str):
+    """
+    Adds the decorated `Backend` class to `BACKENDS` under `name`.
+    """
+
+    def add(cls: Type["Backend"]) -> Type["Backend"]:
+        cls.name = name
+        BACKENDS[name] = cls
+        return cls
+
+    return add
+
+
+class Backend:
+    """
+    A way to run the model. `load` reads the model, then `predict` takes a
+    batch of bags of words and returns the probability of every intent for
+    each, the same as Keras's `predict` does.
+    """
+
+    name = ""
+    path = ""
+
+    def __init__(self) -> None:
+        self.model = None
+        # The seconds its first call of one row took, when `choose_backend`
+        # ran it, the calls after it are warm.
+        self.first_call: Optional[float] = None
+
+    @classmethod
+    def available(cls) -> bool:
+        """
+        If the file of the model is there, `load` may still fail if a
+        library is missing.
+        """
+        return exists(cls.path)
+
+    def load(self) -> "Backend":
+        raise NotImplementedError
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.model.predict(batch)
+
+    def describe(self) -> str:
+        return f"{self.name} ({self.path})"
+
+    def is_stale(self, model_sha256: str) -> bool:
+        """
+        If it was made from another model than the one with this hash.
+        """
+        return getattr(self.model, "model_sha256", model_sha256) != model_sha256
+
+
+@register("keras")
+class KerasBackend(Backend):
+    path = MODEL_PATH
+
+    def load(self) -> Backend:
+        # Disabling warning/logging of Tensorflow.
+        environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+        from tensorflow.keras.models import load_model
+
+        self.model = load_model(self.path)
+        return self
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.model.predict(batch, verbose=0)
+
+
+class _QuantizedBackend(Backend):
+    def load(self) -> Backend:
+        self.model = QuantizedModel(self.path)
+        return self
+
+    def describe(self) -> str:
+        return f"{self.name} with numpy ({self.path})"
+
+
+@register("int8")
+class Int8Backend(_QuantizedBackend):
+    path = QUANTIZED_PATHS["int8"]
+
+
+@register("float16")
+class Float16Backend(_QuantizedBackend):
+    path = QUANTIZED_PATHS["float16"]
+
+
+@register("tflite")
+class TFLiteBackend(Backend):
+    path = TFLITE_PATH
+
+    def load(self) -> Backend:
+        self.model = TFLiteModel(self.path, TFLITE_THREADS)
+        return self
+
+    def describe(self) -> str:
+        return f"tflite with {TFLITE_THREADS} thread(s) ({self.path})"
+
+
+def load_backend(name: str) -> Backend:
+    """
+    Loads the backend registered under `name`.
+
+    Raises:
+        ValueError: If there is no such backend.
+    """
+    if name not in BACKENDS:
+        raise ValueError(
+            f"There is no {name!r} backend, pick one of {', '.join(BACKENDS)} or auto."
+        )
+    return BACKENDS[name]().load()
+
+
+def choose_backend(backends: List[Backend], bags: np.ndarray) -> Backend:
+    """
+    Times `predict` of each loaded backend on the bags, a row at a time like
+    the messages come, and returns the fastest whose most likely intent is
+    the one Keras gives for every bag. Keras is the reference as the model
+    was trained with it, the first backend that runs is when Keras is not
+    loaded or fails. A backend that fails to predict, Eg. one made from a
+    model with another vocabulary, is left out.
+    The timings and the choice are printed and kept in the startup report,
+    the first call of each backend is kept in its `first_call`.
+
+    Raises:
+        RuntimeError: If none of the backends can predict.
+    """
+    # Keras first, the order of the others is kept.
+    backends = sorted(backends, key=lambda b: b.name != "keras")
+    rows = [bags[i : i + 1] for i in range(min(len(bags), AUTO_CALLS))]
+    reference = expected = None
+    timings = {}
+    for backend in backends:
+        try:
+            start = perf_counter()
+            backend.predict(rows[0])
+            backend.first_call = perf_counter() - start
+            found = backend.predict(bags).argmax(axis=1)
+            took = []
+            for row in rows:
+                start = perf_counter()
+                backend.predict(row)
+                took.append(perf_counter() - start)
+        except Exception as e:
+            timings[backend.name] = {"error": repr(e)}
+            print(f"Couldn't run the {backend.name} backend: {e!r}")
+            continue
+        if reference is None:
+            reference, expected = backend, found
+        agrees = bool((found == expected).all())
+        timings[backend.name] = {
+            "ms": median(took) * 1000,
+            "cold_ms": backend.first_call * 1000,
+            "agrees": agrees,
+        }
+        print(
+            f"Backend {backend.describe()}: {timings[backend.name]['ms']:.3f}ms a "
+            f"message, {'agrees' if agrees else 'disagrees'} with {reference.name}"
+        )
+    if reference is None:
+        raise RuntimeError("None of the backends of the model could predict.")
+    best = min(
+        (b for b in backends if timings[b.name].get("agrees")),
+        key=lambda b: timings[b.name]["ms"],
+    )
+    chose_backend(best.name, timings)
+    return best
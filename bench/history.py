@@ -0,0 +1,45 @@
+"""
+Times loading the last page of the chat history, what the app does when it
+opens, and a page deep in the scroll-back, for short and long histories.
+Run it from the root of the repository with `python -m bench.history`, it
+exits with an error if a page takes over `MAX_PAGE_US`.
+"""
+
+import sys
+from tempfile import TemporaryDirectory
+from timeit import repeat
+from os.path import join
+from storage import Storage
+
+# Loose enough for a busy machine. A page that scans or sorts the whole
+# history takes milliseconds at a million messages.
+MAX_PAGE_US = 1000
+
+
+def main():
+    failed = []
+    print(f"{'messages':>9} {'last page (us)':>15} {'deep page (us)':>15}")
+    for count in (100, 10_000, 1_000_000):
+        with TemporaryDirectory() as tmp:
+            storage = Storage(join(tmp, "SideData.sqlite3"))
+            with storage.connect() as conn, conn:
+                conn.executemany(
+                    "INSERT INTO history(from_user, text, unix_ts) VALUES (?, ?, ?);",
+                    ((i % 2, f"Message number {i}", 1.6e9 + i) for i in range(count)),
+                )
+            last = min(repeat(storage.history_page, number=200)) / 200
+            deep = min(repeat(lambda: storage.history_page(50), number=200)) / 200
+            print(f"{count:>9} {last * 1e6:>15.1f} {deep * 1e6:>15.1f}")
+            storage.close()
+        for name, took in (("last", last), ("deep", deep)):
+            if took * 1e6 > MAX_PAGE_US:
+                failed.append(
+                    f"The {name} page of {count} messages took {took * 1e6:.1f}us, "
+                    f"over the bound of {MAX_PAGE_US}us."
+                )
+    if failed:
+        sys.exit("\n".join(failed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Times listing notes with keyset pagination for small and large note counts,
+read from the database and again from the page cache.
+Run it from the root of the repository with `python -m bench.notes`, it
+works on a fresh database in a temporary directory.
+"""
+
+from tempfile import TemporaryDirectory
+from timeit import repeat
+from os.path import join
+from storage import Storage
+
+
+def fill_notes(storage: Storage, count: int) -> None:
+    with storage.connect() as conn, conn:
+        conn.executemany(
+            "INSERT INTO notes(title, description, unix_ts) VALUES (?, ?, ?);",
+            (
+                (f"Note {i}", f"Description of the note number {i}", 1.6e9 + i)
+                for i in range(count)
+            ),
+        )
+
+
+def uncached(storage: Storage, *args) -> None:
+    storage._note_pages.clear()
+    storage.notes_page(*args)
+
+
+def main():
+    print(
+        f"{'notes':>7} {'first page (us)':>16} {'last page (us)':>15} "
+        f"{'cached page (us)':>17}"
+    )
+    for count in (10, 1_000, 100_000):
+        with TemporaryDirectory() as tmp:
+            storage = Storage(join(tmp, "SideData.sqlite3"))
+            fill_notes(storage, count)
+            # The oldest note is the `before` key of the last page.
+            last_key = (1.6e9 + 20, count)
+            first = min(repeat(lambda: uncached(storage), number=200)) / 200
+            last = min(repeat(lambda: uncached(storage, last_key), number=200)) / 200
+            cached = min(repeat(lambda: storage.notes_page(last_key), number=200)) / 200
+            print(
+                f"{count:>7} {first * 1e6:>16.1f} {last * 1e6:>15.1f} "
+                f"{cached * 1e6:>17.1f}"
+            )
+            storage.close()
+
+
+if __name__ == "__main__":
+    main()
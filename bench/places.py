@@ -0,0 +1,33 @@
+"""
+Compares resolving the places of a message one by one against resolving
+them in a single batch. Run it from the root of the repository with
+`python -m bench.places`, it works on a copy of `data/SideData.sqlite3`.
+"""
+
+from shutil import copyfile
+from tempfile import TemporaryDirectory
+from timeit import repeat
+from os.path import join
+from storage import DB_PATH, Storage
+
+PLACES = ["delhi", "london", "tokyo", "new york", "paris", "sydney", "cairo", "lima"]
+
+
+def main():
+    with TemporaryDirectory() as tmp:
+        path = join(tmp, "SideData.sqlite3")
+        copyfile(DB_PATH, path)
+        storage = Storage(path)
+        print(f"{'places':>6} {'serial (us)':>12} {'batch (us)':>12}")
+        for count in (1, 3, len(PLACES)):
+            names = PLACES[:count]
+            serial = min(
+                repeat(lambda: [storage.find_place(n) for n in names], number=200)
+            )
+            batch = min(repeat(lambda: storage.find_places(names), number=200))
+            print(f"{count:>6} {serial / 200 * 1e6:>12.1f} {batch / 200 * 1e6:>12.1f}")
+        storage.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Checks the reminder scheduler: what 100k pending reminders cost while
+nothing is due, and how late the reminders fire. Also times loading the
+to-dos due in the next day out of 100k to-dos. Run it from the root of the
+repository with `python -m bench.scheduler`, it exits with an error if a
+number is over its bound.
+"""
+
+import sys
+from os.path import join
+from random import Random
+from statistics import median
+from tempfile import TemporaryDirectory
+from threading import Event
+from time import perf_counter, process_time, sleep, time
+from scheduler import Scheduler
+from storage import Storage
+
+ITEMS = 100_000
+IDLE_SECONDS = 2
+FIRED = 200
+# The bounds, loose enough for a busy machine. A scheduler polling for due
+# reminders or a scan of all the to-dos is well over them.
+MAX_IDLE_CPU_MS = 20
+MAX_P99_LATE_MS = 10
+MAX_LOAD_DUE_MS = 50
+
+
+def idle_cost() -> float:
+    scheduler = Scheduler()
+    scheduler.start()
+    start = time()
+    # Spread over the next year, none due while we watch.
+    scheduler.schedule_many((start + 3600 + i * 300, print, ()) for i in range(ITEMS))
+    cpu = process_time()
+    sleep(IDLE_SECONDS)
+    cpu = process_time() - cpu
+    print(
+        f"{len(scheduler)} pending, CPU used over {IDLE_SECONDS}s idle: {cpu * 1e3:.2f}ms"
+    )
+    scheduler.close()
+    return cpu * 1e3
+
+
+def lateness() -> float:
+    scheduler = Scheduler()
+    scheduler.start()
+    start = time()
+    scheduler.schedule_many((start + 3600 + i * 300, print, ()) for i in range(ITEMS))
+    late = []
+    done = Event()
+
+    def fire(deadline):
+        late.append(time() - deadline)
+        if len(late) == FIRED:
+            done.set()
+
+    start = time() + 0.1
+    for i in range(FIRED):
+        # Scheduled in a shuffled order, 5ms apart.
+        deadline = start + Random(i).random() * FIRED * 0.005
+        scheduler.schedule(deadline, fire, deadline)
+    done.wait()
+    late.sort()
+    print(
+        f"{FIRED} fired, late by median {median(late) * 1e3:.2f}ms, "
+        f"99th {late[int(FIRED * 0.99)] * 1e3:.2f}ms, max {late[-1] * 1e3:.2f}ms"
+    )
+    scheduler.close()
+    return late[int(FIRED * 0.99)] * 1e3
+
+
+def load_due() -> float:
+    rand = Random(0)
+    now = time()
+    with TemporaryDirectory() as tmp:
+        storage = Storage(join(tmp, "SideData.sqlite3"))
+        with storage.connect() as conn, conn:
+            conn.executemany(
+                "INSERT INTO todos(title, done, due_ts, created_ts) VALUES (?, ?, ?, ?);",
+                (
+                    (
+                        f"To-do {i}",
+                        int(rand.random() < 0.5),
+                        now + rand.random() * 3e7,
+                        now,
+                    )
+                    for i in range(ITEMS)
+                ),
+            )
+        begin = perf_counter()
+        due = storage.due_todos(now, now + 24 * 60 * 60)
+        took = perf_counter() - begin
+        print(
+            f"Loaded {len(due)} to-dos due in a day out of {ITEMS} in {took * 1e3:.2f}ms"
+        )
+        storage.close()
+    return took * 1e3
+
+
+def main():
+    bounds = [
+        ("CPU used idle", idle_cost(), MAX_IDLE_CPU_MS),
+        ("lateness of the 99th percentile", lateness(), MAX_P99_LATE_MS),
+        ("loading the due to-dos", load_due(), MAX_LOAD_DUE_MS),
+    ]
+    failed = [
+        f"{name}: {ms:.2f}ms, over the bound of {bound}ms."
+        for name, ms, bound in bounds
+        if ms > bound
+    ]
+    if failed:
+        sys.exit("\n".join(failed))
+
+
+if __name__ == "__main__":
+    main()
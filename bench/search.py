@@ -0,0 +1,56 @@
+"""
+Times full-text search over 100,000 notes. Run it from the root of the
+repository with `python -m bench.search`, it works on a fresh database in
+a temporary directory.
+"""
+
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from timeit import repeat
+from os.path import join
+from storage import Storage
+
+NOTE_COUNT = 100_000
+QUERIES = [["meeting"], ["presentation", "budget"], ["pre"], ["nothingmatches"]]
+
+
+def fill_notes(storage: Storage, count: int) -> None:
+    rand = Random(0)
+    vocab = [f"word{i}" for i in range(5000)] + [
+        "meeting",
+        "presentation",
+        "budget",
+        "groceries",
+        "birthday",
+    ]
+    with storage.connect() as conn, conn:
+        conn.executemany(
+            "INSERT INTO notes(title, description, unix_ts) VALUES (?, ?, ?);",
+            (
+                (
+                    " ".join(rand.choices(vocab, k=2)),
+                    " ".join(rand.choices(vocab, k=15)),
+                    1.6e9 + i,
+                )
+                for i in range(count)
+            ),
+        )
+
+
+def main():
+    with TemporaryDirectory() as tmp:
+        storage = Storage(join(tmp, "SideData.sqlite3"))
+        start = perf_counter()
+        fill_notes(storage, NOTE_COUNT)
+        print(f"Indexed {NOTE_COUNT} notes in {perf_counter() - start:.2f}s")
+        print(f"{'query':<24} {'matches':>8} {'latency (ms)':>13}")
+        for words in QUERIES:
+            matches = len(storage.search_notes(words, limit=NOTE_COUNT))
+            best = min(repeat(lambda: storage.search_notes(words), number=20)) / 20
+            print(f"{' '.join(words):<24} {matches:>8} {best * 1e3:>13.2f}")
+        storage.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Compares a launch of the chat bot that derives its state from
+`intents.json` with one that loads it from the snapshot. Each run calls the
+real `ChatBot._load_state`, with `chatbot.CONTRACTIONS` and NLTK's stems,
+once in a process of its own, so the first tokenize is paid like at a real
+start. Hashing the files for the key is included, hashing the model is not,
+the bot works it out anyway to check the vocabulary. Needs what the app
+needs, the snapshot is written to a temporary directory. Run it from the
+root of the repository with `python -m bench.snapshot`.
+"""
+
+import sys
+from functools import partial
+from os import remove
+from os.path import exists, join
+from statistics import median
+from subprocess import check_output
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+RUNS = 5
+
+
+def once(path: str) -> None:
+    # In the child process, prints the seconds `_load_state` took.
+    import chatbot
+    from nltk.stem.lancaster import LancasterStemmer
+    from snapshot import load_snapshot, save_snapshot
+    from vocab import MODEL_PATH, file_sha256, open_vocab
+
+    chatbot.load_snapshot = partial(load_snapshot, path=path)
+    chatbot.save_snapshot = partial(save_snapshot, path=path)
+    vocab = open_vocab()
+    model_sha256 = file_sha256(MODEL_PATH)
+    # Only what `_load_state` uses, not the model and the rest of a launch.
+    bot = chatbot.ChatBot.__new__(chatbot.ChatBot)
+    bot._stemmer = LancasterStemmer()
+    had_snapshot = exists(path)
+    start = perf_counter()
+    state = bot._load_state(vocab, model_sha256)
+    took = perf_counter() - start
+    if had_snapshot and state != bot._derive_state(vocab):
+        sys.exit("The snapshot is not what the bot derives.")
+    print(took)
+
+
+def timed(path: str, keep: bool) -> float:
+    took = []
+    for _ in range(RUNS):
+        if not keep and exists(path):
+            remove(path)
+        out = check_output([sys.executable, "-m", "bench.snapshot", "--once", path])
+        took.append(float(out.split()[-1]))
+    return median(took)
+
+
+def main():
+    with TemporaryDirectory() as tmp:
+        path = join(tmp, "engine_snapshot.pkl")
+        derived = timed(path, keep=False)
+        loaded = timed(path, keep=True)
+    print(f"derive from intents.json  {derived * 1000:>7.2f} ms")
+    print(f"hash and load snapshot    {loaded * 1000:>7.2f} ms")
+    print(f"saved at launch           {(derived - loaded) * 1000:>7.2f} ms")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--once"]:
+        once(sys.argv[2])
+    else:
+        main()
@@ -0,0 +1,45 @@
+"""
+Compares the time of a call of Keras's `predict`, of calling the Keras model
+directly and of the TFLite interpreter, for one message and for a batch of
+32. Needs TensorFlow and the model converted by `python -m tflite_model`.
+Run it from the root of the repository with `python -m bench.tflite`.
+"""
+
+from functools import partial
+from os import environ
+from timeit import repeat
+import numpy as np
+
+environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+from tensorflow.keras.models import load_model
+from tflite_model import TFLiteModel
+from vocab import MODEL_PATH
+
+CALLS = 50
+
+
+def main():
+    model = load_model(MODEL_PATH)
+    lite = {threads: TFLiteModel(threads=threads) for threads in (1, 2, 4)}
+    rand = np.random.default_rng(0)
+    width = model.input_shape[1]
+    print(f"{'batch':>5} {'backend':<18} {'ms/call':>8} {'max |diff|':>10}")
+    for rows in (1, 32):
+        # Bags of words, a handful of ones in each row.
+        batch = (rand.random((rows, width)) < 5 / width).astype(np.float32)
+        expected = model.predict(batch, verbose=0)
+        backends = {
+            "keras predict": lambda: model.predict(batch, verbose=0),
+            "keras call": lambda: model(batch, training=False).numpy(),
+        }
+        for threads, interpreter in lite.items():
+            backends[f"tflite {threads} thread"] = partial(interpreter.predict, batch)
+        for name, call in backends.items():
+            call()  # The first call traces or allocates, see `ChatBot._warm_up`.
+            took = min(repeat(call, number=CALLS, repeat=3)) / CALLS
+            diff = np.abs(call() - expected).max()
+            print(f"{rows:>5} {name:<18} {took * 1000:>8.3f} {diff:>10.2e}")
+
+
+if __name__ == "__main__":
+    main()
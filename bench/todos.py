@@ -0,0 +1,70 @@
+"""
+Times listing the open to-dos for small and large to-do counts. Run it from
+the root of the repository with `python -m bench.todos`, it works on a
+fresh database in a temporary directory. It exits with an error if a page
+takes over `MAX_PAGE_US`.
+"""
+
+import sys
+from random import Random
+from tempfile import TemporaryDirectory
+from timeit import repeat
+from os.path import join
+from storage import Storage, todo_key
+
+# Loose enough for a busy machine. A page that scans or sorts all the
+# to-dos takes milliseconds at 100k of them.
+MAX_PAGE_US = 1000
+
+
+def fill_todos(storage: Storage, count: int) -> None:
+    rand = Random(0)
+    with storage.connect() as conn, conn:
+        conn.executemany(
+            "INSERT INTO todos(title, done, priority, due_ts, created_ts) "
+            "VALUES (?, ?, ?, ?, ?);",
+            (
+                (
+                    f"To-do {i}",
+                    int(rand.random() < 0.5),
+                    rand.randint(1, 3),
+                    rand.choice([None, 1.6e9 + rand.random() * 1e8]),
+                    1.6e9,
+                )
+                for i in range(count)
+            ),
+        )
+
+
+def main():
+    failed = []
+    print(f"{'to-dos':>7} {'first page (us)':>16} {'deep page (us)':>15}")
+    for count in (10, 1_000, 100_000):
+        with TemporaryDirectory() as tmp:
+            storage = Storage(join(tmp, "SideData.sqlite3"))
+            fill_todos(storage, count)
+            # A key near the end of the list, amongst the low priority
+            # to-dos without a due time.
+            with storage.connect() as conn:
+                last = conn.execute(
+                    "SELECT id, title, priority, due_ts FROM todos WHERE done = 0 "
+                    "ORDER BY priority DESC, ifnull(due_ts, 9e999) DESC, id DESC "
+                    "LIMIT 1 OFFSET 3;"
+                ).fetchone()
+            key = todo_key(last)
+            first = min(repeat(storage.todos_page, number=200)) / 200
+            deep = min(repeat(lambda: storage.todos_page(key), number=200)) / 200
+            print(f"{count:>7} {first * 1e6:>16.1f} {deep * 1e6:>15.1f}")
+            storage.close()
+        for name, took in (("first", first), ("deep", deep)):
+            if took * 1e6 > MAX_PAGE_US:
+                failed.append(
+                    f"The {name} page of {count} to-dos took {took * 1e6:.1f}us, "
+                    f"over the bound of {MAX_PAGE_US}us."
+                )
+    if failed:
+        sys.exit("\n".join(failed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Compares four users writing notes at the same time into the one shared
+database against each writing into their own with `UserStores`. Every
+write is committed on its own, like a write that must not be lost. Run it
+from the root of the repository with `python -m bench.users`.
+"""
+
+from os.path import join
+from tempfile import TemporaryDirectory
+from threading import Thread
+from time import perf_counter
+from storage import Storage, UserStores
+
+USERS = 4
+WRITES = 500
+
+
+def write_notes(storage: Storage, user: int) -> None:
+    for i in range(WRITES):
+        with storage.connect() as conn, conn:
+            conn.execute(
+                "INSERT INTO notes(title, description, unix_ts) VALUES (?, ?, ?);",
+                (f"Note {i} of {user}", "Some text " * 20, 1.6e9 + i),
+            )
+
+
+def timed(stores) -> float:
+    threads = [Thread(target=write_notes, args=(stores(u), u)) for u in range(USERS)]
+    start = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return perf_counter() - start
+
+
+def main():
+    with TemporaryDirectory() as tmp:
+        shared = Storage(join(tmp, "SideData.sqlite3"))
+        took = timed(lambda user: shared)
+        print(f"shared database:    {USERS * WRITES / took:>8.0f} writes/s")
+        shared.close()
+        users = UserStores(join(tmp, "users"), join(tmp, "SideData.sqlite3"))
+        took = timed(lambda user: users.get(f"user{user}"))
+        print(f"a database a user:  {USERS * WRITES / took:>8.0f} writes/s")
+        users.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Compares the old pickled `(words, classes)` with the mapped vocabulary
+file: the time to open each and to find the words of a message, for the
+vocabulary size we have and a much larger one. Run it from the root of the
+repository with `python -m bench.vocab`.
+"""
+
+from os.path import join
+from pickle import dump, load
+from random import Random
+from tempfile import TemporaryDirectory
+from timeit import repeat
+from vocab import Vocab, write_vocab
+
+MESSAGE = "hey what time is it in delhi right now tell me".split()
+
+
+def main():
+    print(
+        f"{'words':>7} {'unpickle (us)':>14} {'map (us)':>9} "
+        f"{'scan message (us)':>18} {'look up message (us)':>21}"
+    )
+    rand = Random(0)
+    for count in (400, 50_000):
+        words = set(MESSAGE)
+        while len(words) < count:
+            words.add("".join(rand.choice("abcdefghijklmnop") for _ in range(6)))
+        words = sorted(words)
+        classes = [f"intent_{i}" for i in range(40)]
+        with TemporaryDirectory() as tmp:
+            model = join(tmp, "model.h5")
+            with open(model, "wb") as file:
+                file.write(b"model")
+            with open(join(tmp, "dump.pkl"), "wb") as file:
+                dump((words, classes), file)
+            write_vocab(join(tmp, "vocab.bin"), words, classes, model)
+
+            def unpickle():
+                with open(join(tmp, "dump.pkl"), "rb") as file:
+                    return load(file)
+
+            def scan():
+                # What `_bag_of_words` did, every word against the whole list.
+                return [i for w in MESSAGE for i, word in enumerate(words) if w == word]
+
+            vocab = Vocab(join(tmp, "vocab.bin"))
+            opened = min(repeat(unpickle, number=20)) / 20
+            mapped = min(repeat(lambda: Vocab(join(tmp, "vocab.bin")), number=20)) / 20
+            scanned = min(repeat(scan, number=20)) / 20
+            looked = (
+                min(repeat(lambda: [vocab.index(w) for w in MESSAGE], number=20)) / 20
+            )
+            print(
+                f"{count:>7} {opened * 1e6:>14.1f} {mapped * 1e6:>9.1f} "
+                f"{scanned * 1e6:>18.1f} {looked * 1e6:>21.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Compares committing every note write on its own against the write-behind
+queue of `Storage`, which groups them into a few transactions. Run it from
+the root of the repository with `python -m bench.writes`.
+"""
+
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from os.path import join
+from storage import Storage
+
+WRITES = 2000
+
+
+def main():
+    with TemporaryDirectory() as tmp:
+        storage = Storage(join(tmp, "SideData.sqlite3"))
+        start = perf_counter()
+        for i in range(WRITES):
+            with storage.connect() as conn, conn:
+                conn.execute(
+                    "INSERT INTO notes(title, description, unix_ts) VALUES (?, ?, ?);",
+                    ("Note", "Committed on its own", float(i)),
+                )
+        serial = perf_counter() - start
+
+        start = perf_counter()
+        for i in range(WRITES):
+            storage.add_note("Note", "Queued", float(i))
+        acked = perf_counter() - start
+        storage.flush()
+        grouped = perf_counter() - start
+        storage.close()
+    print(f"{WRITES} writes, one commit each : {serial * 1e3:8.1f} ms")
+    print(f"{WRITES} writes, write-behind     : {grouped * 1e3:8.1f} ms")
+    print(f"Caller waited per write          : {acked / WRITES * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,192 @@
-from typing import Union
-from app import ChatBox
-import numpy as np
-from nltk import word_tokenize
+from startup import chose_backend, phase, warmed
+from typing import List, Optional, Tuple, Union
+
+with phase("import app"):
+    from app import ChatBox
+with phase("import numpy"):
+    import numpy as np
+with phase("import nltk"):
+    from nltk import word_tokenize
+    from nltk.stem.lancaster import LancasterStemmer
 from os import environ
-
-# Disabling warning/logging of Tensorflow.
-environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
-from nltk.stem.lancaster import LancasterStemmer
-from tensorflow.keras.models import load_model
+from functools import partial
 from random import choice
 from re import compile
-from pickle import load as pkload, dump as pkdump
+from vocab import MODEL_PATH, VOCAB_PATH, Vocab, file_sha256, open_vocab
+from orchestrator import Orchestrator
+from backends import BACKEND, BACKENDS, Backend, choose_backend, load_backend
+from snapshot import load_snapshot, save_snapshot, snapshot_key
 from json import load as jload
-from msgforms import (
-    DefineFrame,
-    NoteAddFrame,
-    NoteShowFrame,
-    TimeFrame,
-    _BotFrameMsg,
-    NameFrame,
-)
-from sqlite3 import connect
-from pytz import country_timezones, country_names
-from datetime import datetime
-from requests import get, exceptions as req_except
+
+with phase("import msgforms"):
+    from msgforms import (
+        DefineFrame,
+        NoteAddFrame,
+        NoteShowFrame,
+        TodoAddFrame,
+        TodoListFrame,
+        TimeFrame,
+        _BotFrameMsg,
+        NameFrame,
+    )
+with phase("import storage"):
+    from storage import NOTES_PAGE_SIZE, TODOS_PAGE_SIZE, Storage, todo_key
+from datetime import datetime, timedelta
+from time import perf_counter, time
+from threading import Event, Thread
+from scheduler import Scheduler
+
+with phase("import requests"):
+    from requests import get, exceptions as req_except
 
 INV_COMMA_SINGLE_re = compile(r"\s*'\s*")
 IGN_LETTERS_re = compile(r"\?|!|\.|:|,|\(|\)|'")
 PLACE_PREPOSITION = compile(r"\s(?:in|at|on)\s(?=\w+)")
+# Words that join the places in "time in delhi, london and in tokyo now", some
+# of them are also country codes so they are never looked up on there own.
+PLACE_CONNECTORS = {"in", "at", "on", "and", "&", "now"}
+# The longest place names we know have four words, Eg. "sao bernardo do campo".
+PLACE_MAX_WORDS = 4
+WORD_re = compile(r"\w+")
+# Words of "find my note about the presentation" that are not what to search.
+NOTE_SEARCH_IGNORE = set(
+    "find search look for which what my me i note notes about says say with "
+    "the a an of".split()
+)
+# The reminders of the next day are kept scheduled, the later ones are
+# loaded a day at a time, so a long to-do list never fills the heap.
+REMINDER_HORIZON = 24 * 60 * 60
+# The database is tidied once the user is quiet for `MAINTENANCE_IDLE`
+# seconds, and at most once every `MAINTENANCE_EVERY` seconds.
+MAINTENANCE_IDLE = 5 * 60
+MAINTENANCE_EVERY = 24 * 60 * 60
+# Rounds of made up messages run through the model when it is loaded, see
+# `ChatBot._warm_up`. `TENSORBOT_WARMUP=0` skips it.
+WARMUP_ROUNDS = int(environ.get("TENSORBOT_WARMUP", 3))
+INTENTS_PATH = "data/intents.json"
+# The short forms the users type and what they stand for.
+CONTRACTIONS = {
+    "ain't": "am are not",
+    "aren't": "are am not",
+    "can't": "cannot",
+    "can't've": "cannot have",
+    "'cause": "because",
+    "could've": "could have",
+    "couldn't": "could not",
+    "couldn't've": "could not have",
+    "didn't": "did not",
+    "doesn't": "does not",
+    "don't": "do not",
+    "hadn't": "had not",
+    "hadn't've": "had not have",
+    "hasn't": "has not",
+    "haven't": "have not",
+    "he'd": "he had would",
+    "he'd've": "he would have",
+    "he'll": "he shall will",
+    "he'll've": "he shall will have",
+    "he's": "he has is",
+    "how'd": "how did",
+    "how'd'y": "how do you",
+    "how'll": "how will",
+    "how's": "how has is",
+    "i'd": "I had would",
+    "i'd've": "I would have",
+    "i'll": "I shall will",
+    "i'll've": "I shall will have",
+    "i'm": "I am",
+    "i've": "I have",
+    "isn't": "is not",
+    "it'd": "it had would",
+    "it'd've": "it would have",
+    "it'll": "it shall will",
+    "it'll've": "it shall will have",
+    "it's": "it is",
+    "let's": "let us",
+    "ma'am": "madam",
+    "mayn't": "may not",
+    "might've": "might have",
+    "mightn't": "might not",
+    "mightn't've": "might not have",
+    "must've": "must have",
+    "mustn't": "must not",
+    "mustn't've": "must not have",
+    "needn't": "need not",
+    "needn't've": "need not have",
+    "o'clock": "of the clock",
+    "oughtn't": "ought not",
+    "oughtn't've": "ought not have",
+    "shan't": "shall not",
+    "sha'n't": "shall not",
+    "shan't've": "shall not have",
+    "she'd": "she had would",
+    "she'd've": "she would have",
+    "she'll": "she shall will",
+    "she'll've": "she shall will have",
+    "she's": "she has is",
+    "should've": "should have",
+    "shouldn't": "should not",
+    "shouldn't've": "should not have",
+    "so've": "so have",
+    "so's": "so as is",
+    "that'd": "that would had",
+    "that'd've": "that would have",
+    "that's": "that has is",
+    "there'd": "there had would",
+    "there'd've": "there would have",
+    "there's": "there has is",
+    "they'd": "they had would",
+    "they'd've": "they would have",
+    "they'll": "they shall will",
+    "they'll've": "they shall have will have",
+    "they're": "they are",
+    "they've": "they have",
+    "to've": "to have",
+    "wasn't": "was not",
+    "we'd": "we had would",
+    "we'd've": "we would have",
+    "we'll": "we will",
+    "we'll've": "we will have",
+    "we're": "we are",
+    "we've": "we have",
+    "weren't": "were not",
+    "what'll": "what shall will",
+    "what'll've": "what shall will have",
+    "what're": "what are",
+    "what's": "what has is",
+    "what've": "what have",
+    "when's": "when has is",
+    "when've": "when have",
+    "where'd": "where did",
+    "where's": "where has is",
+    "where've": "where have",
+    "who'll": "who shall will",
+    "who'll've": "who shall will have",
+    "who's": "who has is",
+    "who've": "who have",
+    "why's": "why has is",
+    "why've": "why have",
+    "will've": "will have",
+    "won't": "will not",
+    "won't've": "will not have",
+    "would've": "would have",
+    "wouldn't": "would not",
+    "wouldn't've": "would not have",
+    "y'all": "you all",
+    "y'all'd": "you all would",
+    "y'all'd've": "you all would have",
+    "y'all're": "you all are",
+    "y'all've": "you all have",
+    "you'd": "you had would",
+    "you'd've": "you would have",
+    "you'll": "you shall will",
+    "you'll've": "you shall will have",
+    "you're": "you are",
+    "you've": "you have",
+    "wanna": "want to",
+    " m ": " am ",
+    " u ": " you ",
+}
 
 
 class ChatBot:
@@ -39,137 +198,202 @@ class ChatBot:
     was found low, it rather returns a failure message.
     """
 
-    def __init__(self, chatbox: ChatBox) -> None:
+    def __init__(
+        self,
+        chatbox: ChatBox,
+        storage: Optional[Storage] = None,
+        warmup_rounds: int = WARMUP_ROUNDS,
+        backend: str = BACKEND,
+    ) -> None:
         self.chatbox = chatbox
-        self.model = load_model("data/TensorBot_v2.h5")
-        self.words, self.classes = pkload(open("data/chatbot_dump_v2.pkl", "rb"))
-        self.intents = jload(open("data/intents.json", "r"))
-        self.funcs = ChatBotFunctions(self)
-        self.context = None
         self._stemmer = LancasterStemmer()
-        self._contra = {
-            "ain't": "am are not",
-            "aren't": "are am not",
-            "can't": "cannot",
-            "can't've": "cannot have",
-            "'cause": "because",
-            "could've": "could have",
-            "couldn't": "could not",
-            "couldn't've": "could not have",
-            "didn't": "did not",
-            "doesn't": "does not",
-            "don't": "do not",
-            "hadn't": "had not",
-            "hadn't've": "had not have",
-            "hasn't": "has not",
-            "haven't": "have not",
-            "he'd": "he had would",
-            "he'd've": "he would have",
-            "he'll": "he shall will",
-            "he'll've": "he shall will have",
-            "he's": "he has is",
-            "how'd": "how did",
-            "how'd'y": "how do you",
-            "how'll": "how will",
-            "how's": "how has is",
-            "i'd": "I had would",
-            "i'd've": "I would have",
-            "i'll": "I shall will",
-            "i'll've": "I shall will have",
-            "i'm": "I am",
-            "i've": "I have",
-            "isn't": "is not",
-            "it'd": "it had would",
-            "it'd've": "it would have",
-            "it'll": "it shall will",
-            "it'll've": "it shall will have",
-            "it's": "it is",
-            "let's": "let us",
-            "ma'am": "madam",
-            "mayn't": "may not",
-            "might've": "might have",
-            "mightn't": "might not",
-            "mightn't've": "might not have",
-            "must've": "must have",
-            "mustn't": "must not",
-            "mustn't've": "must not have",
-            "needn't": "need not",
-            "needn't've": "need not have",
-            "o'clock": "of the clock",
-            "oughtn't": "ought not",
-            "oughtn't've": "ought not have",
-            "shan't": "shall not",
-            "sha'n't": "shall not",
-            "shan't've": "shall not have",
-            "she'd": "she had would",
-            "she'd've": "she would have",
-            "she'll": "she shall will",
-            "she'll've": "she shall will have",
-            "she's": "she has is",
-            "should've": "should have",
-            "shouldn't": "should not",
-            "shouldn't've": "should not have",
-            "so've": "so have",
-            "so's": "so as is",
-            "that'd": "that would had",
-            "that'd've": "that would have",
-            "that's": "that has is",
-            "there'd": "there had would",
-            "there'd've": "there would have",
-            "there's": "there has is",
-            "they'd": "they had would",
-            "they'd've": "they would have",
-            "they'll": "they shall will",
-            "they'll've": "they shall have will have",
-            "they're": "they are",
-            "they've": "they have",
-            "to've": "to have",
-            "wasn't": "was not",
-            "we'd": "we had would",
-            "we'd've": "we would have",
-            "we'll": "we will",
-            "we'll've": "we will have",
-            "we're": "we are",
-            "we've": "we have",
-            "weren't": "were not",
-            "what'll": "what shall will",
-            "what'll've": "what shall will have",
-            "what're": "what are",
-            "what's": "what has is",
-            "what've": "what have",
-            "when's": "when has is",
-            "when've": "when have",
-            "where'd": "where did",
-            "where's": "where has is",
-            "where've": "where have",
-            "who'll": "who shall will",
-            "who'll've": "who shall will have",
-            "who's": "who has is",
-            "who've": "who have",
-            "why's": "why has is",
-            "why've": "why have",
-            "will've": "will have",
-            "won't": "will not",
-            "won't've": "will not have",
-            "would've": "would have",
-            "wouldn't": "would not",
-            "wouldn't've": "would not have",
-            "y'all": "you all",
-            "y'all'd": "you all would",
-            "y'all'd've": "you all would have",
-            "y'all're": "you all are",
-            "y'all've": "you all have",
-            "you'd": "you had would",
-            "you'd've": "you would have",
-            "you'll": "you shall will",
-            "you'll've": "you shall will have",
-            "you're": "you are",
-            "you've": "you have",
-            "wanna": "want to",
-            " m ": " am ",
-            " u ": " you ",
+        # The files are read on a few threads at once, Keras loading the
+        # model is the longest and the rest is done long before it.
+        steps = Orchestrator("ChatBot")
+        # On "auto" all the backends with their file there are loaded side
+        # by side, one is kept once the vocabulary is there to try them on.
+        if backend == "auto":
+            names = [name for name, cls in BACKENDS.items() if cls.available()]
+        else:
+            names = [backend]
+        for name in names:
+            steps.add(f"load {name}", partial(load_backend, name))
+        steps.add("hash model", lambda: file_sha256(MODEL_PATH))
+        steps.add("load vocabulary", open_vocab)
+        steps.add(
+            "load snapshot", self._load_state, after=("load vocabulary", "hash model")
+        )
+        # A bot serving one of many users gets that user's store from
+        # `UserStores`, the desktop app uses the shared database.
+        steps.add("open storage", lambda: storage or Storage())
+        steps.add(
+            "functions and reminders",
+            lambda storage: ChatBotFunctions(self, storage),
+            after=("open storage",),
+        )
+        steps.start()
+        model_sha256 = steps.result("hash model")
+        backends = []
+        for name in names:
+            try:
+                loaded = steps.result(f"load {name}")
+            except Exception as e:
+                if backend != "auto":
+                    raise
+                print(f"Couldn't load the {name} backend: {e!r}")
+                continue
+            if loaded.is_stale(model_sha256):
+                print(f"The {name} backend has an old model, export it again.")
+                if backend == "auto":
+                    continue
+            backends.append(loaded)
+        if not backends:
+            raise FileNotFoundError(f"There is no model to load, train {MODEL_PATH}.")
+        self.vocab = steps.result("load vocabulary")
+        state = steps.result("load snapshot")
+        self.intents = state["intents"]
+        self._patterns = state["patterns"]
+        self._stems = state["stems"]
+        self._contractions = state["contractions"]
+        self.funcs = steps.result("functions and reminders")
+        self.context = None
+        # Choosing the backend runs all the patterns through the text steps,
+        # so their cold time is taken before it.
+        cold = self._time_text(self._patterns[0])[1] if warmup_rounds > 0 else {}
+        with phase("choose backend"):
+            self.model = self._choose_backend(backends)
+        with phase("warm up"):
+            self._warm_up(warmup_rounds, cold)
+
+    def _choose_backend(self, backends: List[Backend]) -> Backend:
+        """
+        The backend to run the model with, the fastest on the patterns of the
+        intents if there are more to choose from, see `choose_backend`.
+        """
+        if len(backends) == 1:
+            chose_backend(backends[0].name)
+            return backends[0]
+        bags = [self._bag_of_words(self._clean_text(p)) for p in self._patterns]
+        return choose_backend(
+            backends, np.concatenate([bag for bag in bags if bag is not None])
+        )
+
+    def _load_state(self, vocab: Vocab, model_sha256: str) -> dict:
+        """
+        Loads the snapshot of what `_derive_state` works out, or derives it
+        and saves the snapshot if the files changed since it was made.
+        """
+        if vocab.model_sha256 != model_sha256:
+            print("The vocabulary was not made for this model, retrain it.")
+        key = snapshot_key(
+            (file_sha256(INTENTS_PATH), file_sha256(VOCAB_PATH), model_sha256),
+            CONTRACTIONS,
+        )
+        state = load_snapshot(key)
+        if state is None:
+            state = self._derive_state(vocab)
+            save_snapshot(key, state)
+        return state
+
+    def _derive_state(self, vocab: Vocab) -> dict:
+        """
+        Works out everything the bot keeps from its data files, the part of
+        the startup that the snapshot saves.
+
+        Args:
+            vocab (Vocab): The vocabulary of the model.
+
+        Returns:
+            dict: The intents, the patterns of all of them, the stems of the
+            words in those patterns and the contractions, each as
+            `(short form, long form, short form without the ' or None)`. The
+            last is `None` when the short form is a word the model knows.
+        """
+        with open(INTENTS_PATH, "r") as file:
+            intents = jload(file)
+        patterns = [pattern for intent in intents for pattern in intent["patterns"]]
+        # Most words of the messages are words of the patterns, so most
+        # stems need not be worked out again.
+        stems = {}
+        for pattern in patterns:
+            for word in word_tokenize(IGN_LETTERS_re.sub("", pattern.lower())):
+                if word not in stems:
+                    stems[word] = self._stemmer.stem(word)
+        contractions = [
+            (
+                contra,
+                long,
+                (
+                    contra.replace("'", "")
+                    if "'" in contra and contra not in vocab
+                    else None
+                ),
+            )
+            for contra, long in CONTRACTIONS.items()
+        ]
+        return {
+            "intents": intents,
+            "patterns": patterns,
+            "stems": stems,
+            "contractions": contractions,
         }
 
+    def _time_text(self, pattern: str) -> Tuple[Optional[np.ndarray], dict]:
+        """
+        Runs a pattern through the text steps of `get_response`, timed.
+
+        Returns:
+            Tuple[Optional[np.ndarray], dict]: The bag of words of the
+            pattern, and the seconds each step took by name.
+        """
+        start = perf_counter()
+        message = self._clean_text(pattern)
+        cleaned = perf_counter()
+        bag = self._bag_of_words(message)
+        took = {"clean text": cleaned - start, "bag of words": perf_counter() - cleaned}
+        return bag, took
+
+    def _warm_up(self, rounds: int, cold: dict) -> None:
+        """
+        Runs some patterns of the intents through the same steps as
+        `get_response` does, short of the intent functions. The first call of
+        each step is the slow one, Keras traces the model, NLTK loads its
+        tokenizer, so it is paid here on the loader thread and not on the
+        user's first message. The first round is recorded as the cold time
+        and the best of the later ones as the warm time, but a step that ran
+        before, when the backend was chosen, is recorded with its first time
+        from then.
+
+        Args:
+            rounds (int): How many rounds to run, at least two if any. 0 skips
+            the warm-up.
+            cold (dict): The seconds of the steps that ran before, by name.
+        """
+        if rounds <= 0:
+            return
+        rounds = max(rounds, 2)
+        patterns = self._patterns
+        # A bag with some words set, for when a pattern has none the model knows.
+        fallback = np.zeros((1, len(self.vocab)), np.float32)
+        fallback[0, : min(len(self.vocab), 4)] = 1
+        took = {"clean text": [], "bag of words": [], "predict": [], "message": []}
+        for i in range(rounds):
+            # Patterns from all over the intents, not the same one each round.
+            bag, text = self._time_text(patterns[i * len(patterns) // rounds])
+            start = perf_counter()
+            self._predict_class(fallback if bag is None else bag)
+            predicted = perf_counter() - start
+            took["clean text"].append(text["clean text"])
+            took["bag of words"].append(text["bag of words"])
+            took["predict"].append(predicted)
+            took["message"].append(sum(text.values()) + predicted)
+        first = {path: cold.get(path, times[0]) for path, times in took.items()}
+        if self.model.first_call is not None:
+            first["predict"] = self.model.first_call
+        first["message"] = sum(first[path] for path in took if path != "message")
+        for path, times in took.items():
+            warmed(path, first[path], min(times[1:]))
+
     def _clean_text(self, sentence: str) -> str:
         """
         This method cleans the short forms used by the user in
@@ -183,14 +407,12 @@ class ChatBot:
         """
         sentence = sentence.lower()
         sentence = " " + INV_COMMA_SINGLE_re.sub("", sentence)
-        for contra in self._contra:
+        for contra, long, contra_ in self._contractions:
             if contra in sentence:
-                sentence.replace(contra, self._contra[contra])
+                sentence.replace(contra, long)
                 continue
-            if "'" in contra:
-                contra_ = contra.replace("'", "")
-                if contra_ in sentence.split(" ") and contra not in self.words:
-                    sentence.replace(contra_, self._contra[contra])
+            if contra_ is not None and contra_ in sentence.split(" "):
+                sentence.replace(contra_, long)
             sentence = IGN_LETTERS_re.sub("", sentence)
         return sentence[1:]
 
@@ -206,16 +428,18 @@ class ChatBot:
             of words bot recognise
         """
         sentence_word = word_tokenize(sentence)
-        sentence_word = [self._stemmer.stem(word) for word in sentence_word]
-        bag = [0] * len(self.words)
+        sentence_word = [
+            self._stems.get(word) or self._stemmer.stem(word) for word in sentence_word
+        ]
+        bag = np.zeros((1, len(self.vocab)), np.float32)
         word_match_counter = 0
         for sent_word in sentence_word:
-            for i, word in enumerate(self.words):
-                if sent_word == word:
-                    bag[i] = 1
-                    word_match_counter += 1
+            i = self.vocab.index(sent_word)
+            if i is not None:
+                bag[0, i] = 1
+                word_match_counter += 1
         if word_match_counter != 0:
-            return np.array([bag])
+            return bag
         else:
             return None
 
@@ -231,7 +455,7 @@ class ChatBot:
         """
         results = self.model.predict(bag)[0]
         likely_classes = [
-            (intent, res) for intent, res in zip(self.classes, results) if res > 0.1
+            (self.vocab.label(i), res) for i, res in enumerate(results) if res > 0.1
         ]
         likely_classes.sort(key=lambda x: x[1], reverse=True)
         return np.array(likely_classes)
@@ -247,6 +471,7 @@ class ChatBot:
             Union[str, _BotFrameMsg]: A message in form of string or
             a Special form of `QFrame` that functions of what user need.
         """
+        self.funcs.postpone_maintenance()
         message = self._clean_text(message)
         bag = self._bag_of_words(message)
         if bag is not None:
@@ -292,8 +517,9 @@ class ChatBot:
             return "Hmmm..."
 
     def close(self):
-        # We must close the database connection.
-        self.funcs.db.close()
+        # We must stop the reminders and close the database connections.
+        self.funcs.scheduler.close()
+        self.funcs.storage.close()
 
 
 class ChatBotFunctions:
@@ -302,41 +528,126 @@ class ChatBotFunctions:
     corresponding intent is triggered by the user.
     """
 
-    def __init__(self, chatbot: ChatBot) -> None:
+    def __init__(self, chatbot: ChatBot, storage: Storage) -> None:
         self.chatbot = chatbot
-        self.db = connect("data/SideData.sqlite3")
+        self.storage = storage
         # I used this api for fetching jokes and definations.
         self._jokes_api_url = "https://v2.jokeapi.dev/joke/Programming,Miscellaneous,Dark,Spooky?blacklistFlags=nsfw"
         self._define_api_url = "https://api.dictionaryapi.dev/api/v2/entries/en/"
-        try:
-            self._user_name = pkload(open("data/username.pkl", "rb"))
-        except FileNotFoundError:
-            self._user_name = None
         self.functions = {
             "good_time": self._good_time,
             "make_joke": self._make_joke,
             "time_user": self._time_user,
             "time_somewhere": self._time_somewhere,
             "define": self._define,
-            "add_to_do": None,
-            "show_to_do": None,
+            "add_to_do": self._add_todo,
+            "show_to_do": self._show_todo,
             "create_a_note": self._create_note,
             "show_note": self._show_note,
+            "find_note": self._find_note,
             "mimic": None,
-            "wish_birthday": None,
+            "wish_birthday": self._wish_birthday,
             "set_user_name": self._set_user_name,
             "get_user_name": self._get_user_name,
         }
+        self.scheduler = Scheduler()
+        self.scheduler.start()
+        self._load_reminders(time())
+        # Set while the user is chatting, it stops a running maintenance.
+        self._chatting = Event()
+        self._maintenance = None
+        self.postpone_maintenance()
 
     @property
     def user_name(self):
-        return self._user_name or ""
+        return self.storage.settings.get("user_name") or ""
 
     @user_name.setter
     def user_name(self, text: str):
-        # Dump the user name string so that we can access it later,
-        pkdump(text, open("data/username.pkl", "wb+"))
-        self._user_name = text
+        # Saved in the background so that we can access it later.
+        self.storage.settings["user_name"] = text
+
+    def _load_reminders(self, start: float) -> None:
+        """
+        Schedules the to-dos due and the birthdays coming within
+        `REMINDER_HORIZON` from `start`, and this again for the window after.
+        """
+        stop = start + REMINDER_HORIZON
+        calls = [
+            (due_ts, self._remind_todo, (todo_id,))
+            for todo_id, _, _, due_ts in self.storage.due_todos(start, stop)
+        ]
+        # Birthdays are wished at the midnight they begin.
+        midnights = {}
+        day = datetime.fromtimestamp(start).date()
+        midnight = datetime(day.year, day.month, day.day).timestamp()
+        while midnight < stop:
+            if midnight >= start:
+                midnights[day.month, day.day] = midnight
+                if (day + timedelta(days=1)).month == 3 and day.day == 28:
+                    # Not a leap year, the ones born on 29th Feb get it today.
+                    midnights[2, 29] = midnight
+            day += timedelta(days=1)
+            midnight = datetime(day.year, day.month, day.day).timestamp()
+        calls.extend(
+            (midnights[month, day], self._wish_birthday_now, (name,))
+            for name, month, day in self.storage.birthdays_on(midnights)
+        )
+        calls.append((stop, self._load_reminders, (stop,)))
+        self._reminders_until = stop
+        self.scheduler.schedule_many(calls)
+
+    def postpone_maintenance(self) -> None:
+        """
+        Stops the database maintenance if it is running, and schedules it
+        for when the user has been quiet for a while.
+        """
+        self._chatting.set()
+        if self._maintenance is not None:
+            self.scheduler.cancel(self._maintenance)
+        last = self.storage.settings.get("last_maintenance", 0)
+        when = max(time() + MAINTENANCE_IDLE, last + MAINTENANCE_EVERY)
+        self._maintenance = self.scheduler.schedule(when, self._start_maintenance)
+
+    def _start_maintenance(self) -> None:
+        # It gets a thread of its own, so that the reminders are not held up.
+        self._chatting.clear()
+        Thread(target=self._maintain, name="maintenance", daemon=True).start()
+
+    def _maintain(self) -> None:
+        report = self.storage.maintain(stop=self._chatting)
+        before, after = report["before"], report["after"]
+        print(
+            f"Database maintenance: {before['size'] / 1e6:.1f}MB -> "
+            f"{after['size'] / 1e6:.1f}MB, free pages {before['free_pages']} -> "
+            f"{after['free_pages']}, slow plans {before['slow_plans']} -> "
+            f"{after['slow_plans']}, integrity {report['integrity']}, "
+            f"done {report['done']}"
+        )
+        if report["integrity"] is not None:
+            # Everything ran, otherwise it is tried again at the next quiet time.
+            self.storage.settings["last_maintenance"] = time()
+        if not self._chatting.is_set():
+            # When the user stopped it, `get_response` scheduled it already.
+            self.postpone_maintenance()
+
+    def _remind_todo(self, todo_id: int) -> None:
+        # This runs on the scheduler thread, the to-do may have been done or
+        # deleted since it was scheduled.
+        todo = self.storage.open_todo(todo_id)
+        if todo is None:
+            return
+        msg = f'Reminder: "{todo[1]}" is due now.'
+        self.chatbot.chatbox.run_on_gui.emit(
+            lambda: self.chatbot.chatbox.add_bot_msg(msg)
+        )
+
+    def _wish_birthday_now(self, name: str) -> None:
+        # This runs on the scheduler thread too.
+        msg = f"Happy birthday {name.capitalize()}!".replace(" !", "!")
+        self.chatbot.chatbox.run_on_gui.emit(
+            lambda: self.chatbot.chatbox.add_bot_msg(msg)
+        )
 
     def _time_user(self, text: str):
         """
@@ -356,36 +667,71 @@ class ChatBotFunctions:
 
     def _time_somewhere(self, text: str):
         """
-        This function will search for the timezone in the database.
-        if there is any match, it returns the time for that timezone.
+        This function will search for the timezones in the database.
+        All the places in the message are looked up together, and if any
+        of them matches, it returns the time for all of them in one frame.
         Matches for city and country gives the time for all the timezone
         that are connected to that country.
         """
-        prob_place_name = PLACE_PREPOSITION.split(text)[-1]
-        if prob_place_name.endswith(" now"):
-            prob_place_name = " ".join(prob_place_name.split(" ")[:-1])
-        curs = self.db.cursor()
-        curs.execute(
-            "SELECT country_code FROM timezones "
-            f"WHERE country_code='{prob_place_name}' "
-            f"OR country_name='{prob_place_name}';"
-        )
-        place_code = curs.fetchone()
-        if place_code is None:
-            curs.execute(
-                "SELECT country_code FROM timezones "
-                f"WHERE country_city LIKE '%{prob_place_name}%';",
-            )
-            place_code = curs.fetchone()
-        if place_code is None:
+        places = self._extract_places(text)
+        if not places:
             return self._time_user("place not found.")
-        timezones = country_timezones[place_code[0]]
-        timeFrame = TimeFrame(self.chatbot.chatbox, country_names[place_code[0]])
-        for tz in timezones:
-            timeFrame.add_time_from_timezone(tz)
+        timeFrame = TimeFrame(
+            self.chatbot.chatbox, [country_name for country_name, _ in places]
+        )
+        for _, timezones in places:
+            for tz in timezones:
+                timeFrame.add_time_from_timezone(tz)
         timeFrame.apply()
         return timeFrame
 
+    def _extract_places(self, text: str) -> List[Tuple[str, List[str]]]:
+        """
+        Finds every place named after the first preposition of the message.
+        The commas are already gone by the time the message reaches here,
+        so every run of upto `PLACE_MAX_WORDS` words is a candidate, all of
+        them are resolved in a single batch and the longest matches win. A
+        two letter word is only taken for a country code when it stands
+        alone between `PLACE_CONNECTORS`, like "us" in "in delhi and us
+        now", else "in paris is it" would also give Iceland and Italy.
+
+        Returns:
+            List[Tuple[str, List[str]]]: The country name and the timezones
+            of each distinct place, in the order user named them.
+        """
+        words = PLACE_PREPOSITION.split(text, 1)[-1].split()
+
+        def alone(i: int) -> bool:
+            return all(
+                j < 0 or j == len(words) or words[j] in PLACE_CONNECTORS
+                for j in (i - 1, i + 1)
+            )
+
+        spans = [
+            (start, stop)
+            for start in range(len(words))
+            for stop in range(start + 1, min(start + PLACE_MAX_WORDS, len(words)) + 1)
+            if stop - start > 1
+            or (
+                words[start] not in PLACE_CONNECTORS
+                and (len(words[start]) > 2 or alone(start))
+            )
+        ]
+        found = self.storage.find_places([" ".join(words[i:j]) for i, j in spans])
+        matches = {span: place for span, place in zip(spans, found) if place}
+        places = []
+        start = 0
+        while start < len(words):
+            for stop in range(min(start + PLACE_MAX_WORDS, len(words)), start, -1):
+                if (start, stop) in matches:
+                    if matches[start, stop] not in places:
+                        places.append(matches[start, stop])
+                    start = stop
+                    break
+            else:
+                start += 1
+        return places
+
     def _good_time(self, text: str):
         """
         Greets the user according to the time.
@@ -453,6 +799,22 @@ class ChatBotFunctions:
         else:
             return self._set_user_name(text)
 
+    def _wish_birthday(self, text: str):
+        """
+        Wishes the user and remembers the day, to wish them again next year.
+        """
+        today = datetime.now()
+        self.storage.set_birthday(self.user_name, today.month, today.day)
+        wish = choice(
+            [
+                "Happy birthday{}! 🎂",
+                "Many happy returns of the day{}!",
+                "Happy birthday{}, have a great one!",
+            ]
+        )
+        name = self.user_name and " " + self.user_name.capitalize()
+        return wish.format(name) + " I will remember it for next year."
+
     def _make_joke(self, text: str):
         """
         Makes an api call. If it fails to fetch the joke, this
@@ -505,10 +867,6 @@ class ChatBotFunctions:
                 return word
         return word
 
-    def _show_note(self, text: str):
-        curs = self.db.cursor()
-        curs.execute("SELECT * FROM notes")
-
     def _create_note(self, text: str):
         frame = NoteAddFrame(self.chatbot.chatbox)
         frame.apply()
@@ -516,44 +874,111 @@ class ChatBotFunctions:
         def save_note_to_db():
             title = frame.titleEdit.text()
             desc = frame.descEdit.toPlainText()
-            curs = self.db.cursor()
-            curs.execute(
-                "INSERT INTO notes VALUES (?, ?, ?);",
-                [title, desc, datetime.now().timestamp()],
+            frame.createBtn.setText("Saving")
+            self.storage.add_note(
+                title, desc, datetime.now().timestamp(), callback=note_saved
             )
-            self.db.commit()
-            curs.close()
-            frame.createBtn.setText("Created")
+
+        def note_saved(note_id, error):
+            # This runs on the storage writer thread.
+            text = "Failed" if error is not None else "Created"
+            self.chatbot.chatbox.run_on_gui.emit(lambda: frame.createBtn.setText(text))
 
         frame.createBtn.clicked.connect(save_note_to_db)
         return frame
 
     def _show_note(self, text: str) -> None:
-        frame = NoteShowFrame(self.chatbot.chatbox)
-        curs = self.db.cursor()
-        curs.execute("SELECT * FROM notes")
-        notes = curs.fetchall()
-        curs.close()
-        for note in notes:
-            title = note[0]
-            desc = (
-                datetime.fromtimestamp(note[2]).strftime(
-                    '%a %d %b, %Y <span style="color:32a852;">|</span> %H:%M'
+        frame = NoteShowFrame(
+            self.chatbot.chatbox, self.storage.notes_page, self.storage.notes_count
+        )
+
+        def delete_note_from_db():
+            self.storage.delete_note(frame.current_note_id())
+
+        frame.del_btn.clicked.connect(delete_note_from_db)
+        frame.apply()
+        return frame
+
+    def _find_note(self, text: str):
+        """
+        Searches the notes for the words in the message and shows the
+        matches, best first, in the same viewer as `_show_note`.
+        """
+        words = [w for w in WORD_re.findall(text) if w not in NOTE_SEARCH_IGNORE]
+        results = self.storage.search_notes(words)
+        if not results:
+            return "I couldn't find any note about that."
+        ranks = {(note[3], note[0]): rank for rank, note in enumerate(results)}
+
+        # The matches are ordered by rank, not by time, so the viewer pages
+        # over the list itself, `older` just means further down the list.
+        # The key may belong to a note deleted meanwhile, so it is placed by
+        # its rank rather than looked up in the list.
+        def fetch_page(key, older):
+            if key is None:
+                return (
+                    results[:NOTES_PAGE_SIZE] if older else results[-NOTES_PAGE_SIZE:]
                 )
-                + "<br>"
-                + note[1]
-            )
-            frame.append_note(title, desc)
+            before = sum(ranks[note[3], note[0]] < ranks[key] for note in results)
+            if not older:
+                return results[max(0, before - NOTES_PAGE_SIZE) : before]
+            if before < len(results) and results[before][0] == key[1]:
+                before += 1
+            return results[before : before + NOTES_PAGE_SIZE]
+
+        frame = NoteShowFrame(self.chatbot.chatbox, fetch_page, results.__len__)
 
         def delete_note_from_db():
-            curs = self.db.cursor()
-            curs.execute(
-                "DELETE FROM notes WHERE title = ?",
-                (frame.notes[frame._now_showing][0],),
-            )
-            self.db.commit()
-            curs.close()
+            note_id = frame.current_note_id()
+            self.storage.delete_note(note_id)
+            results[:] = [note for note in results if note[0] != note_id]
 
         frame.del_btn.clicked.connect(delete_note_from_db)
         frame.apply()
         return frame
+
+    def _add_todo(self, text: str):
+        frame = TodoAddFrame(self.chatbot.chatbox)
+        frame.apply()
+
+        def save_todo_to_db():
+            frame.createBtn.setText("Saving")
+            due_ts = frame.due_ts()
+            self.storage.add_todo(
+                frame.titleEdit.text().strip(),
+                due_ts,
+                frame.priority(),
+                datetime.now().timestamp(),
+                callback=lambda todo_id, error: todo_saved(todo_id, error, due_ts),
+            )
+
+        def todo_saved(todo_id, error, due_ts):
+            # This runs on the storage writer thread. The reminders due
+            # after the loaded window are picked up by `_load_reminders`.
+            if error is None and due_ts is not None:
+                if time() <= due_ts < self._reminders_until:
+                    self.scheduler.schedule(due_ts, self._remind_todo, todo_id)
+            text = "Failed" if error is not None else "Created"
+            self.chatbot.chatbox.run_on_gui.emit(lambda: frame.createBtn.setText(text))
+
+        frame.createBtn.clicked.connect(save_todo_to_db)
+        return frame
+
+    def _show_todo(self, text: str):
+        """
+        Shows the open to-dos, this is also where user removes them.
+        """
+
+        def fetch_page(last):
+            return self.storage.todos_page(None if last is None else todo_key(last))
+
+        frame = TodoListFrame(
+            self.chatbot.chatbox,
+            fetch_page,
+            self.storage.open_todos_count,
+            TODOS_PAGE_SIZE,
+        )
+        frame.todoDone.connect(self.storage.set_todo_done)
+        frame.todoDeleted.connect(self.storage.delete_todo)
+        frame.apply()
+        return frame
@@ -1,11 +1,16 @@
+import sys
+from os.path import abspath, dirname
 from time import sleep
 from pytz import country_names as cn_pytz
-from sqlite3 import connect
 
+sys.path.append(dirname(dirname(abspath(__file__))))
+from storage import Storage
+
+country_codes = list(cn_pytz.keys())
 country_names = list(cn_pytz.values())
 i = 1
 line = ""
-conn = connect("./data/SideData.sqlite3")
+storage = Storage()
 
 for name in country_names:
     if len(line.rstrip()) > 100:
@@ -24,6 +29,7 @@ try:
             if i < 0:
                 raise IndexError
             count_name = country_names[i - 1]
+            count_code = country_codes[i - 1].lower()
         except ValueError:
             print("The city number should be int.", i, "is not an integer.")
             sleep(3)
@@ -47,11 +53,7 @@ try:
             )
         )
         if conf.lower() == "y":
-            curs = conn.cursor()
-            curs.execute(
-                "UPDATE country_city SET country_city = ? WHERE country_name = ?",
-                (city_name + ",", count_name),
-            )
+            storage.add_city(city_name, count_code)
             n += 1
         else:
             print("Its not a yes.")
@@ -59,3 +61,4 @@ try:
             continue
 except KeyboardInterrupt:
     print(f"Okay added {n}", "cities." if n != 1 else "city.")
+    storage.close()
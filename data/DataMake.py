@@ -4,48 +4,21 @@ You can get one from https://azure.microsoft.com/en-ca/pricing/details/cognitive
 Also mention the location of your service to speech recognisation to work.
 """
 
-import pickle as pkl
-
-pkl.dump(('YOUR_API_KEY', 'YOUR_API_LOCATION'), open('data/API.pkl', 'wb+'))
+API_KEY = 'YOUR_API_KEY'
+API_LOCATION = 'YOUR_API_LOCATION'
 
 """
 Dont touch the bollow part. This will ready your database.
 """
 
-import sqlite3 as sql
-
-open('data/SideData2.sqlite3', 'w+').close()
-
-conn = sql.connect('data/SideData2.sqlite3')
-curs = conn.cursor()
-
-curs.execute("""
-CREATE TABLE IF NOT EXISTS timezones(
-    country_code varchar(2),
-    country_name varchar(4),
-    country_city text
-)
-""")
-curs.execute("""
-CREATE TABLE IF NOT EXISTS notes(
-    title varchar(20),
-    descrption varchar(200),
-    unix_ts numeric
-)
-""")
-
-from pytz import country_names, country_timezones
-data = []
-
-for coun_code, coun_name in country_names.items():
-    data.append((coun_code.lower(), coun_name.lower(), None))
+import sys
+from os.path import abspath, dirname
 
-curs.executemany("""
-INSERT INTO timezones VALUES(
-    ?, ?, ?
-)
-""", data)
+sys.path.append(dirname(dirname(abspath(__file__))))
+from storage import Storage
 
-conn.commit()
-curs.close()
-conn.close()
\ No newline at end of file
+# Opening the database creates all the tables and fills the countries
+# and their timezones. The api key is kept in the settings table.
+storage = Storage()
+storage.settings.update(speech_api_key=API_KEY, speech_api_location=API_LOCATION)
+storage.close()
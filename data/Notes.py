@@ -0,0 +1,82 @@
+"""
+Exports all the notes to a file, or imports them from one, to back them up
+or to move them to another machine. Run it from the root of the repository:
+
+    python data/Notes.py export notes.jsonl
+    python data/Notes.py import notes.csv
+
+The format is picked by the extension of the file, `.jsonl` has one
+`{"title", "description", "unix_ts"}` object per line and `.csv` has the
+columns `title,description,unix_ts` with a header row. Notes are streamed
+a batch at a time, so any size of file works with the same memory.
+"""
+
+import csv
+import json
+import sys
+from argparse import ArgumentParser
+from os.path import abspath, dirname
+from time import perf_counter
+from typing import Iterable, Iterator, TextIO, Tuple
+
+sys.path.append(dirname(dirname(abspath(__file__))))
+from storage import Storage
+
+FIELDS = ("title", "description", "unix_ts")
+
+
+def read_jsonl(file: TextIO) -> Iterator[Tuple[str, str, float]]:
+    for line in file:
+        if line.strip():
+            note = json.loads(line)
+            yield note["title"], note["description"], float(note["unix_ts"])
+
+
+def read_csv(file: TextIO) -> Iterator[Tuple[str, str, float]]:
+    for note in csv.DictReader(file):
+        yield note["title"], note["description"], float(note["unix_ts"])
+
+
+def write_jsonl(file: TextIO, notes: Iterable[Tuple[str, str, float]]) -> int:
+    count = 0
+    for note in notes:
+        file.write(json.dumps(dict(zip(FIELDS, note)), ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+def write_csv(file: TextIO, notes: Iterable[Tuple[str, str, float]]) -> int:
+    writer = csv.writer(file)
+    writer.writerow(FIELDS)
+    count = 0
+    for note in notes:
+        writer.writerow(note)
+        count += 1
+    return count
+
+
+def main():
+    parser = ArgumentParser(description="Import or export the notes.")
+    parser.add_argument("command", choices=("import", "export"))
+    parser.add_argument("file", help="A .jsonl or .csv file.")
+    args = parser.parse_args()
+    as_csv = args.file.lower().endswith(".csv")
+    storage = Storage()
+    start = perf_counter()
+    if args.command == "import":
+        with open(args.file, "r", encoding="utf-8", newline="") as file:
+            count = storage.import_notes(read_csv(file) if as_csv else read_jsonl(file))
+    else:
+        with open(args.file, "w", encoding="utf-8", newline="") as file:
+            write = write_csv if as_csv else write_jsonl
+            count = write(file, storage.iter_notes())
+    took = perf_counter() - start
+    storage.close()
+    print(
+        f"{args.command.capitalize()}ed {count} notes in {took:.2f}s "
+        f"({count / max(took, 1e-9):,.0f} notes/s)."
+    )
+
+
+if __name__ == "__main__":
+    main()
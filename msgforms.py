@@ -1,3 +1,4 @@
+from typing import Callable, List, Optional, Tuple, Union
 from PyQt5 import QtWidgets, QtGui, QtCore
 from app import ChatBox
 from pytz import timezone
@@ -25,6 +26,12 @@ DEFINE_Style = (
     " .ex{color: rgb(190,190,190);font-size:18px;font-style:italic;margin-left:15px;}"
     "</style>\n"
 )
+# Names and colors of the to-do priorities 1, 2 and 3.
+TODO_PRIORITIES = [
+    ("High", "rgb(255, 74, 77)"),
+    ("Normal", "rgb(25, 155, 255)"),
+    ("Low", "rgb(150, 150, 150)"),
+]
 
 
 class _BotFrameMsg(QtWidgets.QFrame):
@@ -82,10 +89,18 @@ class TimeFrame(_BotFrameMsg):
     """
 
     @QtCore.pyqtSlot(ChatBox, str)
-    def __init__(self, parent: ChatBox, place_name: str = None) -> None:
+    @QtCore.pyqtSlot(ChatBox, list)
+    def __init__(
+        self, parent: ChatBox, place_name: Union[str, List[str]] = None
+    ) -> None:
         super().__init__(parent)
         place_name = place_name or "Your place"
-        self.set_heading(f"Current time in {place_name.capitalize()}")
+        if isinstance(place_name, str):
+            place_name = [place_name]
+        place_name = [name.capitalize() for name in place_name]
+        if len(place_name) > 1:
+            place_name = [", ".join(place_name[:-1]), place_name[-1]]
+        self.set_heading(f"Current time in {' and '.join(place_name)}")
         self.setStyleSheet(self.styleSheet())
         self.timezonesgrid = QtWidgets.QGridLayout()
         self.timezonesgrid.setContentsMargins(0, 0, 0, 0)
@@ -346,16 +361,33 @@ class NoteAddFrame(_BotFrameMsg):
 
 class NoteShowFrame(_BotFrameMsg):
     """
-    This frame shows a pagination of all the notes created by user.
+    This frame shows a pagination of all the notes created by user. It only
+    holds a small window of notes, when user pages past its edge the next
+    or previous page is fetched with `fetch_page`. So the frame costs the
+    same for 10 or 100,000 notes.
 
     Inherits:
         _BotFrameMsg
     """
 
-    @QtCore.pyqtSlot(ChatBox)
-    def __init__(self, chatbox: ChatBox) -> None:
+    @QtCore.pyqtSlot(ChatBox, object, object)
+    def __init__(
+        self,
+        chatbox: ChatBox,
+        fetch_page: Callable[[Optional[Tuple[float, int]], bool], List[tuple]],
+        count_notes: Callable[[], int],
+    ) -> None:
         super().__init__(chatbox)
+        # `fetch_page(key, older)` returns the `(id, title, description,
+        # unix_ts)` of the notes older or newer than `key`, newest first.
+        self.fetch_page = fetch_page
+        self.count_notes = count_notes
         self.notes = []
+        self._window_start = 0  # Position of `self.notes[0]` among all notes.
+        self._total = 0
+        # Ids of the notes deleted here, their deletes may still be queued
+        # in the storage so a page fetched now can still have them.
+        self._deleted = set()
         self.setFixedWidth(500)
         self.descLabel = QtWidgets.QLabel(self)
         self._now_showing = 0
@@ -367,16 +399,57 @@ class NoteShowFrame(_BotFrameMsg):
         self.anim = QtCore.QPropertyAnimation(self, b"maximumHeight")
         self.setStyleSheet(self.styleSheet() + BTN_StyleSheet + LNE_StyleSheet)
 
+    @staticmethod
+    def _key(note: tuple) -> Tuple[float, int]:
+        return note[3], note[0]
+
+    def _fetch(self, key: Optional[Tuple[float, int]], older: bool) -> List[tuple]:
+        page = self.fetch_page(key, older)
+        return [note for note in page if note[0] not in self._deleted]
+
+    def _note_at(self, number: int) -> tuple:
+        """
+        Returns the note at `number`, newest first, fetching the page it
+        is on if it is not in the window.
+        """
+        offset = number - self._window_start
+        if 0 <= offset < len(self.notes):
+            return self.notes[offset]
+        if self.notes and offset == len(self.notes):
+            self.notes = self._fetch(self._key(self.notes[-1]), True)
+            self._window_start = number
+        elif self.notes and offset == -1:
+            self.notes = self._fetch(self._key(self.notes[0]), False)
+            self._window_start = number - len(self.notes) + 1
+        elif number == 0:
+            self.notes = self._fetch(None, True)
+            self._window_start = 0
+        else:
+            # Wrapped around from the first note to the oldest one.
+            self.notes = self._fetch(None, False)
+            self._window_start = number - len(self.notes) + 1
+        return self.notes[number - self._window_start]
+
+    def current_note_id(self) -> int:
+        return self._note_at(self._now_showing)[0]
+
     @QtCore.pyqtSlot(int, bool)
     def _show_note_number(self, number, animate=True) -> None:
         self._now_showing = number
-        note = self.notes[number]
-        self._heading.setText(note[0])
-        self.descLabel.setText(note[1])
+        note_id, title, desc, unix_ts = self._note_at(number)
+        desc = (
+            datetime.fromtimestamp(unix_ts).strftime(
+                '%a %d %b, %Y <span style="color:32a852;">|</span> %H:%M'
+            )
+            + "<br>"
+            + desc
+        )
+        self._heading.setText(title)
+        self.descLabel.setText(desc)
         fnt_mat = self.descLabel.fontMetrics()
         new_h = (
             fnt_mat.boundingRect(
-                QtCore.QRect(0, 0, 400, 0), QtCore.Qt.TextFlag.TextWordWrap, note[1]
+                QtCore.QRect(0, 0, 400, 0), QtCore.Qt.TextFlag.TextWordWrap, desc
             ).height()
             + fnt_mat.height()
         )  # Because of an extra "<br>"
@@ -391,7 +464,7 @@ class NoteShowFrame(_BotFrameMsg):
         else:
             self._height = 70 + new_h
             self.setMaximumHeight(self._height)
-        self.cur_page.setText(f"{number+1} / {len(self.notes)}")
+        self.cur_page.setText(f"{number+1} / {self._total}")
 
     def refresh_anim(self):
         # Connected to the current animation finished signal, this function deletes old animation object and create a new one.
@@ -401,7 +474,7 @@ class NoteShowFrame(_BotFrameMsg):
 
     @QtCore.pyqtSlot(bool)
     def _toggle_pagination(self, enabled=True):
-        if len(self.notes) >= 1:
+        if self._total >= 1:
             self.back_btn.setEnabled(enabled)
             self.next_btn.setEnabled(enabled)
         else:
@@ -409,33 +482,42 @@ class NoteShowFrame(_BotFrameMsg):
             self.next_btn.setEnabled(False)
 
     def _show_next(self):
-        self._show_note_number((self._now_showing + 1) % len(self.notes))
+        self._show_note_number((self._now_showing + 1) % self._total)
 
     def _show_back(self):
-        self._show_note_number((self._now_showing - 1) % len(self.notes))
-
-    @QtCore.pyqtSlot(str, str)
-    def append_note(self, title, desc) -> None:
-        self.notes.append((title, desc))
+        self._show_note_number((self._now_showing - 1) % self._total)
 
     @QtCore.pyqtSlot(int)
     def _delete_note(self, number) -> None:
-        self.notes.pop(number)
-        if len(self.notes) == 0:
+        offset = number - self._window_start
+        note = self.notes.pop(offset)
+        self._deleted.add(note[0])
+        # The delete may still be queued in the storage, so the count is
+        # not asked for again.
+        self._total -= 1
+        if self._total == 0:
             self.del_btn.setDisabled(True)
             self._heading.setText("Nothing to see here :(")
             self.descLabel.setText('Create a new note, try saying "Create a note."')
-        else:
-            self._show_next()
+            return
+        if offset == len(self.notes):
+            # That was the last note of the window, the notes after it are
+            # the next page. It is keyed on the deleted note, the note
+            # before it would fetch it again while its delete is queued.
+            self.notes = self._fetch(self._key(note), True)
+            self._window_start = number
+        # The note after the deleted one has taken its number now.
+        self._show_note_number(number % self._total)
 
     def apply(self) -> None:
         self.setFixedWidth(500)
+        self._total = self.count_notes()
         # First we have to check wether user has any notes or not.
-        if self.notes == []:
+        if self._total == 0:
             self.set_heading("Nothing to see here :(")
             self.descLabel.setText('Create a new note, try saying "Create a note."')
             return
-        self.set_heading(self.notes[0][0])
+        self.set_heading(self._note_at(0)[1])
         fnt = QtGui.QFont("Ink Free", 10)
         self.descLabel.setFont(fnt)
         self.descLabel.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
@@ -454,7 +536,7 @@ class NoteShowFrame(_BotFrameMsg):
         self.cur_page.setStyleSheet("border : 0")
         self.cur_page.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
         # If I found the note count in 1 then disable pagination
-        if len(self.notes) <= 1:
+        if self._total <= 1:
             self._toggle_pagination()
         self.horzlay.addWidget(self.del_btn)
         self.horzlay.addWidget(self.cur_page)
@@ -463,3 +545,204 @@ class NoteShowFrame(_BotFrameMsg):
         self.vertlay.addLayout(self.horzlay)
         # Show the note number 1 without any animation.
         self._show_note_number(0, False)
+
+
+class TodoAddFrame(_BotFrameMsg):
+    """
+    This frame helps user to add a new to-do, with a priority
+    and, if user wants, a time it is due at.
+
+    Inherits:
+        _BotFrameMsg
+    """
+
+    @QtCore.pyqtSlot(ChatBox)
+    def __init__(self, chatbox: ChatBox) -> None:
+        super().__init__(chatbox)
+        self.titleEdit = QtWidgets.QLineEdit(self)
+        self.priorityBox = QtWidgets.QComboBox(self)
+        self.dueCheck = QtWidgets.QCheckBox("Due at", self)
+        self.dueEdit = QtWidgets.QDateTimeEdit(self)
+        self.createBtn = QtWidgets.QPushButton("Create", self)
+        self.cancelBtn = QtWidgets.QPushButton("Cancel", self)
+        self.opt_horzlay = QtWidgets.QHBoxLayout()
+        self.btn_horzlay = QtWidgets.QHBoxLayout()
+        self.setStyleSheet(self.styleSheet() + BTN_StyleSheet + LNE_StyleSheet)
+
+    def priority(self) -> int:
+        # The items are in the order of `TODO_PRIORITIES`, 1 is high.
+        return self.priorityBox.currentIndex() + 1
+
+    def due_ts(self) -> Optional[float]:
+        if not self.dueCheck.isChecked():
+            return None
+        return float(self.dueEdit.dateTime().toSecsSinceEpoch())
+
+    def apply(self) -> None:
+        self.set_heading("Add a to-do")
+        self.setObjectName("todoAddFrame")
+        self.vertlay.setSpacing(10)
+        fnt = self.titleEdit.font()
+        fnt.setPointSize(12)
+        self.titleEdit.setFont(fnt)
+        self.titleEdit.setPlaceholderText("What do you have to do?")
+        self.titleEdit.setMinimumHeight(40)
+        self.titleEdit.setMaxLength(50)
+        self.vertlay.addWidget(self.titleEdit)
+        self.priorityBox.addItems([name for name, _ in TODO_PRIORITIES])
+        self.priorityBox.setCurrentIndex(1)
+        self.opt_horzlay.addWidget(self.priorityBox)
+        self.dueEdit.setDateTime(QtCore.QDateTime.currentDateTime().addSecs(3600))
+        self.dueEdit.setCalendarPopup(True)
+        self.dueEdit.setDisabled(True)
+        self.dueCheck.toggled.connect(self.dueEdit.setEnabled)
+        self.opt_horzlay.addWidget(self.dueCheck)
+        self.opt_horzlay.addWidget(self.dueEdit)
+        self.vertlay.addLayout(self.opt_horzlay)
+
+        def toggleCreateBtn() -> None:
+            self.createBtn.setEnabled(len(self.titleEdit.text().strip()) != 0)
+
+        self.titleEdit.textChanged.connect(toggleCreateBtn)
+        self.titleEdit.returnPressed.connect(self.createBtn.click)
+        self.createBtn.setEnabled(False)
+        self.createBtn.setStyleSheet(SAVE_StyleSheet)
+        self.createBtn.setFixedSize(QtCore.QSize(60, 30))
+        self.btn_horzlay.addWidget(self.createBtn, 0, QtCore.Qt.AlignLeft)
+
+        def disableFrame() -> None:
+            for widget in (
+                self.cancelBtn,
+                self.createBtn,
+                self.titleEdit,
+                self.priorityBox,
+                self.dueCheck,
+                self.dueEdit,
+            ):
+                widget.setDisabled(True)
+
+        self.cancelBtn.clicked.connect(disableFrame)
+        self.createBtn.clicked.connect(disableFrame)
+        self.cancelBtn.setStyleSheet(CANC_StyleSheet)
+        self.cancelBtn.setFixedSize(QtCore.QSize(60, 30))
+        self.btn_horzlay.addWidget(self.cancelBtn, 0, QtCore.Qt.AlignRight)
+        self.vertlay.addLayout(self.btn_horzlay)
+        self._height += 150  # Line-edit, options and Buttons
+
+
+class TodoListFrame(_BotFrameMsg):
+    """
+    This frame lists the open to-dos a page at a time, the most urgent
+    first. Every to-do can be checked off or deleted, which is sent out
+    with the `todoDone` and `todoDeleted` signals. Only the shown page is
+    held, the next one is fetched with `fetch_page` on demand.
+
+    Inherits:
+        _BotFrameMsg
+    """
+
+    todoDone = QtCore.pyqtSignal(int, bool)
+    todoDeleted = QtCore.pyqtSignal(int)
+
+    @QtCore.pyqtSlot(ChatBox, object, object, int)
+    def __init__(
+        self,
+        chatbox: ChatBox,
+        fetch_page: Callable[[Optional[tuple]], List[tuple]],
+        count_todos: Callable[[], int],
+        page_size: int,
+    ) -> None:
+        super().__init__(chatbox)
+        # `fetch_page(last)` returns the `(id, title, priority, due_ts)` of
+        # the to-dos after `last`, the last to-do of the previous page.
+        self.fetch_page = fetch_page
+        self.count_todos = count_todos
+        self.page_size = page_size
+        self.todos = []
+        self._page_after = [None]  # The `last` to fetch each page seen with.
+        self._total = 0
+        self.setFixedWidth(500)
+        self.todosgrid = QtWidgets.QGridLayout()
+        self.rows: List[List[QtWidgets.QWidget]] = []
+        self.next_btn = QtWidgets.QPushButton("❯", self)
+        self.back_btn = QtWidgets.QPushButton("❮", self)
+        self.cur_page = QtWidgets.QLabel("", self)
+        self.horzlay = QtWidgets.QHBoxLayout()
+        self.setStyleSheet(self.styleSheet() + BTN_StyleSheet + LNE_StyleSheet)
+
+    def _show_page(self, number: int) -> None:
+        self.todos = self.fetch_page(self._page_after[number])
+        del self._page_after[number + 1 :]
+        self._page_after.append(self.todos[-1] if self.todos else None)
+        for row in self.rows:
+            for widget in row:
+                widget.setParent(None)
+        self.rows = []
+        now = datetime.now().timestamp()
+        for i, (todo_id, title, priority, due_ts) in enumerate(self.todos):
+            check = QtWidgets.QCheckBox(title, self)
+            check.toggled.connect(
+                lambda done, todo_id=todo_id: self.todoDone.emit(todo_id, done)
+            )
+            name, color = TODO_PRIORITIES[priority - 1]
+            info = f'<span style="color:{color};">{name}</span>'
+            if due_ts is not None:
+                due = datetime.fromtimestamp(due_ts).strftime("%d %b, %H:%M")
+                if due_ts < now:
+                    due = f'<span style="color:rgb(255, 74, 77);">{due}</span>'
+                info += " | " + due
+            info_lbl = QtWidgets.QLabel(info, self)
+            info_lbl.setStyleSheet("border:0")
+            del_btn = QtWidgets.QPushButton("🗑", self)
+            del_btn.setFixedSize(QtCore.QSize(30, 30))
+            del_btn.setStyleSheet(CANC_StyleSheet)
+
+            def delete(_, todo_id=todo_id, row=(check, info_lbl, del_btn)):
+                for widget in row:
+                    widget.setDisabled(True)
+                self.todoDeleted.emit(todo_id)
+
+            del_btn.clicked.connect(delete)
+            self.todosgrid.addWidget(check, i, 0)
+            self.todosgrid.addWidget(info_lbl, i, 1, QtCore.Qt.AlignRight)
+            self.todosgrid.addWidget(del_btn, i, 2)
+            self.rows.append([check, info_lbl, del_btn])
+        pages = max(1, -(-self._total // self.page_size))
+        self.cur_page.setText(f"{number + 1} / {pages}")
+        self.back_btn.setEnabled(number > 0)
+        self.next_btn.setEnabled(number + 1 < pages)
+        self._height = 35 + 40 * len(self.todos) + 45
+        self.setMaximumHeight(self._height)
+
+    def _show_next(self) -> None:
+        self._show_page(len(self._page_after) - 1)
+
+    def _show_back(self) -> None:
+        self._show_page(len(self._page_after) - 3)
+
+    def apply(self) -> None:
+        self._total = self.count_todos()
+        if self._total == 0:
+            self.set_heading("Nothing to do :)")
+            hint = QtWidgets.QLabel('Add one, try saying "Add a to do."', self)
+            hint.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
+            self.vertlay.addWidget(hint)
+            self._height += 35
+            return
+        self.set_heading("Your to-dos")
+        self.todosgrid.setContentsMargins(0, 5, 0, 5)
+        self.todosgrid.setVerticalSpacing(5)
+        self.vertlay.addLayout(self.todosgrid)
+        self.next_btn.setFixedSize(QtCore.QSize(30, 30))
+        self.next_btn.setStyleSheet(SAVE_StyleSheet)
+        self.next_btn.clicked.connect(self._show_next)
+        self.back_btn.setFixedSize(QtCore.QSize(30, 30))
+        self.back_btn.setStyleSheet(SAVE_StyleSheet)
+        self.back_btn.clicked.connect(self._show_back)
+        self.cur_page.setStyleSheet("border : 0")
+        self.cur_page.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
+        self.horzlay.addWidget(self.cur_page)
+        self.horzlay.addWidget(self.back_btn)
+        self.horzlay.addWidget(self.next_btn)
+        self.vertlay.addLayout(self.horzlay)
+        self._show_page(0)
@@ -0,0 +1,184 @@
+"""
+Runs the steps of the startup that don't depend on each other at the same
+time. Every step names the steps it needs and is started on a thread of a
+pool as soon as those are done, the steps that touch Qt widgets are run on
+the GUI thread instead. The steps are timed like the phases of `startup`,
+and once all are done the chain of steps the startup waited on, its critical
+path, is added to the startup report.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from queue import Queue
+from threading import Lock, current_thread
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from startup import STARTED, phase, traced
+
+# Most steps wait on the disk or on C code that lets go of the GIL, so a few
+# threads are enough to overlap them.
+INIT_WORKERS = 4
+
+
+class _Step:
+    def __init__(
+        self, name: str, func: Callable, after: Iterable[str], gui: bool, always: bool
+    ) -> None:
+        self.name = name
+        self.func = func
+        self.after = tuple(after)
+        self.gui = gui
+        self.always = always
+        self.future = Future()
+        self.waiting = len(self.after)
+        self.needed_by: List["_Step"] = []
+        self.thread = None
+        self.start = self.end = None
+
+
+class Orchestrator:
+    """
+    The steps of a startup and the threads that run them. Add all the steps
+    with `add`, then call `start` to run the pool steps and `run_gui` on the
+    GUI thread to run the others.
+
+    Args:
+        name (str): Names the threads and the critical path in the report.
+        workers (int): The threads of the pool.
+    """
+
+    def __init__(self, name: str, workers: int = INIT_WORKERS) -> None:
+        self.name = name
+        self._steps: Dict[str, _Step] = {}
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix=name)
+        self._gui = Queue()
+        self._lock = Lock()
+        self._left = 0
+
+    def add(
+        self,
+        name: str,
+        func: Callable,
+        after: Iterable[str] = (),
+        gui: bool = False,
+        always: bool = False,
+    ) -> None:
+        """
+        Adds a step, `func` is called with the results of the steps in
+        `after` in that order. Those must be added before it, which is also
+        why there can be no cycles. If one of them fails, the step fails with
+        the same error without being called.
+
+        Args:
+            name (str): Unique name of the step, Eg. "load_model".
+            func (Callable): What the step does, its return is its result.
+            after (Iterable[str]): The steps it needs.
+            gui (bool): Run it on the thread calling `run_gui`.
+            always (bool): Call it even if a step it needs failed, with the
+            error in place of that step's result. For a step that must
+            report the failure.
+        """
+        step = _Step(name, func, after, gui, always)
+        for needed in step.after:
+            self._steps[needed].needed_by.append(step)
+        self._steps[name] = step
+        self._left += 1
+
+    def start(self) -> None:
+        """
+        Starts the steps that need no other step.
+        """
+        for step in list(self._steps.values()):
+            if not step.after:
+                self._ready(step)
+
+    def run_gui(self) -> None:
+        """
+        Runs the GUI steps on this thread as they become ready, returns once
+        all of them are done while the pool may still be busy.
+
+        Raises:
+            Exception: The error of the first GUI step that failed.
+        """
+        gui = [step for step in self._steps.values() if step.gui]
+        for _ in gui:
+            self._run(self._gui.get())
+        for step in gui:
+            step.future.result()
+
+    def result(self, name: str, timeout: Optional[float] = None) -> Any:
+        """
+        Waits for a step and returns its result, raises its error if it
+        failed.
+        """
+        return self._steps[name].future.result(timeout)
+
+    def critical_path(self) -> List[dict]:
+        """
+        The chain of steps that ended last: the last step to end, the step
+        it needed that ended last, and so on back to the start.
+
+        Returns:
+            List[dict]: The steps in the order they ran, each with its name,
+            thread, start and time taken in seconds. Empty before all steps
+            are done.
+        """
+        with self._lock:
+            if self._left:
+                return []
+        path = []
+        step = max(self._steps.values(), key=lambda step: step.end)
+        while step is not None:
+            path.append(
+                {
+                    "name": step.name,
+                    "thread": step.thread,
+                    "start": step.start - STARTED,
+                    "seconds": step.end - step.start,
+                }
+            )
+            needed = [self._steps[name] for name in step.after]
+            step = max(needed, key=lambda step: step.end) if needed else None
+        return path[::-1]
+
+    @staticmethod
+    def _result(step: _Step, always: bool) -> Any:
+        error = step.future.exception()
+        if error is None:
+            return step.future.result()
+        if always:
+            return error
+        raise error
+
+    def _ready(self, step: _Step) -> None:
+        if step.gui:
+            self._gui.put(step)
+        else:
+            self._pool.submit(self._run, step)
+
+    def _run(self, step: _Step) -> None:
+        step.thread = current_thread().name
+        step.start = perf_counter()
+        try:
+            args = [self._result(self._steps[name], step.always) for name in step.after]
+            with phase(step.name):
+                result = step.func(*args)
+        except BaseException as e:
+            step.end = perf_counter()
+            step.future.set_exception(e)
+        else:
+            step.end = perf_counter()
+            step.future.set_result(result)
+        with self._lock:
+            ready = []
+            for other in step.needed_by:
+                other.waiting -= 1
+                if not other.waiting:
+                    ready.append(other)
+            self._left -= 1
+            done = not self._left
+        for other in ready:
+            self._ready(other)
+        if done:
+            # Nothing is submitted any more, the threads end when idle.
+            self._pool.shutdown(wait=False)
+            traced(self.name, self.critical_path())
@@ -0,0 +1,259 @@
+"""
+Smaller copies of the model: the weights of its Dense layers stored as int8,
+with a scale per output unit, or as float16. The first layer is as wide as
+the vocabulary, so it is most of the model and it grows with every pattern
+added to `intents.json`, in int8 it takes a quarter of the space.
+
+`QuantizedModel` runs such a copy with numpy alone, set
+`TENSORBOT_MODEL=int8` or `float16` to have the chat bot use one. Run
+`python -m quantize` after training to export both and to compare them with
+the float32 model, it needs TensorFlow and NLTK like the training does.
+"""
+
+import sys
+from json import dump, load
+from os.path import getsize
+from re import compile
+from subprocess import check_output
+from time import perf_counter
+from typing import Dict, List, Optional
+import numpy as np
+from vocab import MODEL_PATH, file_sha256
+
+QUANTIZED_PATHS = {
+    "int8": "data/TensorBot_v2.int8.npz",
+    "float16": "data/TensorBot_v2.float16.npz",
+}
+REPORT_PATH = "quantize_report.json"
+IGN_LETTERS_re = compile(r"\?|!|\.|:|,|\(|\)|'")
+
+
+def _softmax(x: np.ndarray) -> np.ndarray:
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "sigmoid": lambda x: 1 / (1 + np.exp(-x)),
+    "tanh": np.tanh,
+    "softmax": _softmax,
+}
+
+
+def export_quantized(model_path: str = MODEL_PATH) -> Dict[str, str]:
+    """
+    Writes the int8 and the float16 copy of a Keras model of Dense and
+    Dropout layers, the ones `train.ipynb` makes. Dropout does nothing when
+    predicting, so it is left out.
+
+    Returns:
+        Dict[str, str]: The paths written, by their kind.
+    """
+    from tensorflow.keras.layers import Dense, Dropout
+    from tensorflow.keras.models import load_model
+
+    model = load_model(model_path)
+    layers = []
+    for layer in model.layers:
+        if isinstance(layer, Dropout):
+            continue
+        if not isinstance(layer, Dense):
+            raise ValueError(f"Can't quantize the {type(layer).__name__} layer.")
+        activation = layer.get_config()["activation"]
+        if activation not in ACTIVATIONS:
+            raise ValueError(f"Can't quantize the {activation} activation.")
+        kernel, bias = layer.get_weights()
+        layers.append((kernel.astype(np.float32), bias.astype(np.float32), activation))
+    common = {
+        "activations": np.array([activation for _, _, activation in layers]),
+        "model_sha256": np.array(file_sha256(model_path)),
+    }
+    int8, float16 = dict(common), dict(common)
+    for i, (kernel, bias, _) in enumerate(layers):
+        # A scale per output unit, one large weight only costs the precision
+        # of the weights of its own unit.
+        scale = np.abs(kernel).max(axis=0) / 127
+        scale[scale == 0] = 1
+        int8[f"kernel{i}"] = np.clip(np.round(kernel / scale), -127, 127).astype(
+            np.int8
+        )
+        int8[f"scale{i}"] = scale.astype(np.float32)
+        int8[f"bias{i}"] = bias
+        float16[f"kernel{i}"] = kernel.astype(np.float16)
+        float16[f"bias{i}"] = bias.astype(np.float16)
+    np.savez(QUANTIZED_PATHS["int8"], **int8)
+    np.savez(QUANTIZED_PATHS["float16"], **float16)
+    return dict(QUANTIZED_PATHS)
+
+
+class QuantizedModel:
+    """
+    A model written by `export_quantized`. The weights stay int8 or float16
+    in memory and each layer is widened to float32 only while it is used.
+    `predict` takes and returns the same as Keras's.
+    """
+
+    def __init__(self, path: str) -> None:
+        with np.load(path) as data:
+            self.model_sha256 = str(data["model_sha256"])
+            self._layers = []
+            for i, activation in enumerate(data["activations"]):
+                scale = data[f"scale{i}"] if f"scale{i}" in data else None
+                self._layers.append(
+                    (
+                        data[f"kernel{i}"],
+                        scale,
+                        data[f"bias{i}"].astype(np.float32),
+                        ACTIVATIONS[str(activation)],
+                    )
+                )
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        """
+        The output of the model for each row of the batch.
+        """
+        x = np.asarray(batch, np.float32)
+        for kernel, scale, bias, activation in self._layers:
+            x = x @ kernel.astype(np.float32)
+            if scale is not None:
+                # The same as widening the kernel with its scales first.
+                x *= scale
+            x = activation(x + bias)
+        return x
+
+
+def _corpus(vocab, stem, tokenize) -> Dict[str, List[np.ndarray]]:
+    """
+    The bags of the patterns of the intents and of the messages the user
+    sent, made like `ChatBot._bag_of_words` makes them. Texts with none of
+    the model's words are left out, the bot doesn't ask the model for those.
+    """
+
+    def bag(text: str) -> Optional[np.ndarray]:
+        words = tokenize(IGN_LETTERS_re.sub("", text.lower()))
+        found = [vocab.index(stem(word)) for word in words]
+        found = [i for i in found if i is not None]
+        if not found:
+            return None
+        row = np.zeros((1, len(vocab)), np.float32)
+        row[0, found] = 1
+        return row
+
+    from storage import Storage
+
+    with open("data/intents.json") as file:
+        patterns = [p for intent in load(file) for p in intent["patterns"]]
+    storage = Storage()
+    messages, before = [], None
+    while True:
+        page = storage.history_page(before, 500)
+        if not page:
+            break
+        messages.extend(text for _, from_user, text, _ in page if from_user)
+        before = page[-1][0]
+    storage.close()
+    bags = {"intents": [bag(text) for text in patterns]}
+    bags["logged messages"] = [bag(text) for text in messages]
+    return {name: [b for b in found if b is not None] for name, found in bags.items()}
+
+
+def _agreement(predict, bags: List[np.ndarray], expected: List[int]) -> Optional[float]:
+    # How often the most likely intent is the expected one.
+    if not bags:
+        return None
+    same = [int(predict(b).argmax()) == top for b, top in zip(bags, expected)]
+    return sum(same) / len(same)
+
+
+def _rss_of(kind: str) -> int:
+    # Measured in a process of its own, so what the other models hold is
+    # not counted.
+    out = check_output([sys.executable, "-m", "quantize", "--rss", kind])
+    return int(out.split()[-1])
+
+
+def _load(kind: str):
+    if kind == "float32":
+        from tensorflow.keras.models import load_model
+
+        return load_model(MODEL_PATH)
+    return QuantizedModel(QUANTIZED_PATHS[kind])
+
+
+def report() -> dict:
+    """
+    Compares the quantized copies with the float32 model: the size of the
+    file, the memory the loaded model takes, the time to predict a message
+    and how often its most likely intent is the same as float32's on the
+    patterns of the intents and on the messages in the chat history.
+    """
+    from nltk import word_tokenize
+    from nltk.stem.lancaster import LancasterStemmer
+    from vocab import open_vocab
+
+    corpus = _corpus(open_vocab(), LancasterStemmer().stem, word_tokenize)
+    models = {kind: _load(kind) for kind in ("float32", *QUANTIZED_PATHS)}
+    expected = {
+        name: [int(models["float32"].predict(b, verbose=0).argmax()) for b in bags]
+        for name, bags in corpus.items()
+    }
+    results = {"texts": {name: len(bags) for name, bags in corpus.items()}}
+    for kind, model in models.items():
+        predict = (
+            (lambda b: model.predict(b, verbose=0))
+            if kind == "float32"
+            else model.predict
+        )
+        sample = corpus["intents"][:100]
+        for b in sample:
+            predict(b)  # The warm-up, see `ChatBot._warm_up`.
+        took = []
+        for b in sample:
+            start = perf_counter()
+            predict(b)
+            took.append(perf_counter() - start)
+        path = MODEL_PATH if kind == "float32" else QUANTIZED_PATHS[kind]
+        results[kind] = {
+            "file_bytes": getsize(path),
+            "rss_bytes": _rss_of(kind),
+            "latency_ms": float(np.median(took) * 1000),
+            "agreement": {
+                name: _agreement(predict, bags, expected[name])
+                for name, bags in corpus.items()
+            },
+        }
+    return results
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--rss"]:
+        from startup import rss
+
+        if sys.argv[2] == "float32":
+            # Importing TensorFlow is not part of what the model takes.
+            import tensorflow.keras.models
+        before = rss()
+        model = _load(sys.argv[2])
+        print(rss() - before)
+        sys.exit()
+    for kind, path in export_quantized().items():
+        print(f"Wrote the {kind} model to {path}.")
+    results = report()
+    with open(REPORT_PATH, "w") as file:
+        dump(results, file, indent=2)
+    texts = results.pop("texts")
+    names = list(texts)
+    print(
+        f"{'model':<8} {'file (KB)':>9} {'RSS (MB)':>8} {'ms/message':>10} "
+        + " ".join(f"{f'top-1 {name} ({texts[name]})':>28}" for name in names)
+    )
+    for kind, found in results.items():
+        agree = [found["agreement"][name] for name in names]
+        print(
+            f"{kind:<8} {found['file_bytes'] / 1024:>9.0f} "
+            f"{found['rss_bytes'] / 2**20:>8.1f} {found['latency_ms']:>10.3f} "
+            + " ".join(f"{'-' if a is None else f'{a:.1%}':>28}" for a in agree)
+        )
+    print(f"The report is in {REPORT_PATH}.")
@@ -0,0 +1,102 @@
+"""
+Runs things at a later time, like the reminder for a to-do when it is due
+or wishing the user on their birthday. All the pending reminders sit in one
+min-heap ordered by their deadline, and one thread sleeps until the earliest
+of them, so nothing polls and a thousand reminders cost the same one thread.
+"""
+
+from heapq import heapify, heappop, heappush
+from itertools import count
+from threading import Condition, Thread
+from time import time
+from traceback import print_exc
+from typing import Any, Callable, Iterable, List, Tuple
+
+
+class Scheduler(Thread):
+    """
+    Calls the scheduled functions on its own thread once their time comes.
+    The functions should be quick, anything for the GUI must be handed over
+    with `ChatBox.run_on_gui`.
+
+    The times are unix timestamps, like the `due_ts` of the to-dos.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(name="scheduler", daemon=True)
+        # Entries are `[when, seq, func, args]`, `seq` keeps the heap from
+        # ever comparing two functions that are due at the same time.
+        self._heap: List[list] = []
+        self._seq = count()
+        self._cond = Condition()
+        self._closed = False
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, when: float, func: Callable, *args: Any) -> list:
+        """
+        Calls `func(*args)` at `when`, right away if that is in the past.
+
+        Returns:
+            list: The entry of the call, to `cancel` it.
+        """
+        entry = [when, next(self._seq), func, args]
+        with self._cond:
+            heappush(self._heap, entry)
+            # The timer only has to wake up when it should now wake earlier.
+            if self._heap[0] is entry:
+                self._cond.notify()
+        return entry
+
+    def schedule_many(self, calls: Iterable[Tuple[float, Callable, tuple]]) -> None:
+        """
+        Schedules a lot of `(when, func, args)` calls in one go, cheaper than
+        calling `schedule` for each when loading them at the startup.
+        """
+        with self._cond:
+            self._heap.extend([when, next(self._seq), f, a] for when, f, a in calls)
+            heapify(self._heap)
+            self._cond.notify()
+
+    def cancel(self, entry: list) -> None:
+        """
+        Cancels a call from `schedule`. It stays in the heap until its time
+        comes, but it is not called then.
+        """
+        entry[2] = None
+
+    def run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if self._heap:
+                        timeout = self._heap[0][0] - time()
+                        if timeout <= 0:
+                            break
+                    else:
+                        timeout = None
+                    self._cond.wait(timeout)
+                if self._closed:
+                    return
+                due = []
+                now = time()
+                while self._heap and self._heap[0][0] <= now:
+                    due.append(heappop(self._heap))
+            # The calls are made outside the lock, so they can schedule more.
+            for _, _, func, args in due:
+                if func is None:
+                    continue
+                try:
+                    func(*args)
+                except Exception:
+                    # One broken reminder must not stop all the others.
+                    print_exc()
+
+    def close(self) -> None:
+        """
+        Stops the timer, the calls still pending are dropped.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
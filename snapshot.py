@@ -0,0 +1,69 @@
+"""
+The state the chat bot derives from its data files at every launch, the
+parsed intents, the stems of the words in their patterns and the contraction
+table checked against the vocabulary. It is kept in one pickle keyed by the
+SHA-256 of the files it was derived from, so a launch with the same files
+loads it in one read and a changed file has it rebuilt.
+"""
+
+from hashlib import sha256
+from os import replace
+from pickle import HIGHEST_PROTOCOL, UnpicklingError, dumps, loads
+from typing import Any, Iterable, Optional
+
+SNAPSHOT_PATH = "data/engine_snapshot.pkl"
+# Bumped when what the chat bot derives changes, so old snapshots are rebuilt.
+SNAPSHOT_VERSION = 1
+
+
+def snapshot_key(digests: Iterable[str], *extra: Any) -> str:
+    """
+    The key of a snapshot derived from the files with these content hashes,
+    Eg. from `vocab.file_sha256`.
+
+    Args:
+        digests (Iterable[str]): The hashes of the files, in a fixed order.
+        extra: Anything else the snapshot was derived from, it must have a
+        stable `repr`.
+
+    Returns:
+        str: The hex SHA-256 of it all.
+    """
+    key = sha256(f"snapshot {SNAPSHOT_VERSION}".encode("utf-8"))
+    for digest in digests:
+        key.update(digest.encode("utf-8"))
+    key.update(repr(extra).encode("utf-8"))
+    return key.hexdigest()
+
+
+def load_snapshot(key: str, path: str = SNAPSHOT_PATH) -> Optional[dict]:
+    """
+    Reads the snapshot at `path` in one go.
+
+    Returns:
+        Optional[dict]: The state, `None` if there is no snapshot, it was made
+        from other files or it is broken.
+    """
+    try:
+        with open(path, "rb") as file:
+            stored_key, state = loads(file.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, UnpicklingError, ValueError, TypeError) as e:
+        print(f"Ignoring the broken snapshot {path}: {e}")
+        return None
+    return state if stored_key == key else None
+
+
+def save_snapshot(key: str, state: dict, path: str = SNAPSHOT_PATH) -> None:
+    """
+    Writes the state under the key. It is written next to `path` and moved
+    over it, so a launch at the same time never reads half of it. Failing to
+    write it only costs the next launch a rebuild.
+    """
+    try:
+        with open(path + ".tmp", "wb") as file:
+            file.write(dumps((key, state), HIGHEST_PROTOCOL))
+        replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"Could not save the snapshot {path}: {e}")
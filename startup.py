@@ -0,0 +1,212 @@
+"""
+Times the startup of the app. `mark` notes when a milestone like the first
+paint is reached, `phase` times a block of imports or setup and `warmed`
+keeps the cold and warm latency the chat bot measured at its warm-up.
+`traced` keeps the critical path of the steps run in parallel and
+`chose_backend` the backend the model runs on.
+
+Run the app with `TENSORBOT_PROFILE=<folder>` set, or with
+`--profile-startup[=<folder>]`, to also record the wall time and memory of
+every phase and write them to `startup_profile.json` (to compare across
+releases) and `startup_profile.txt` (to read) in the folder, `.` if none.
+This module is imported first, so the clock starts before PyQt loads.
+"""
+
+import sys
+from contextlib import contextmanager
+from json import dump
+from os import environ
+from os.path import join
+from platform import platform, python_version
+from threading import Lock, current_thread
+from time import perf_counter, time
+from typing import Iterator, List, Optional
+
+STARTED = perf_counter()
+STARTUP_TIMES = {}
+# The first (cold) and a later (warm) call of each inference path, timed by
+# the warm-up of the chat bot.
+WARMUP_TIMES = {}
+# The backend the chat bot runs the model with, and the timings it was
+# chosen by if it was chosen on "auto".
+BACKEND = {}
+# The critical path of each `orchestrator.Orchestrator` by its name.
+CRITICAL_PATHS = {}
+
+
+def _profile_folder() -> Optional[str]:
+    for arg in sys.argv[1:]:
+        if arg == "--profile-startup":
+            return "."
+        if arg.startswith("--profile-startup="):
+            return arg.split("=", 1)[1]
+    return environ.get("TENSORBOT_PROFILE") or None
+
+
+PROFILE_FOLDER = _profile_folder()
+# The phases timed so far, in the order they ended.
+PHASES = []
+_lock = Lock()
+
+
+def rss() -> Optional[int]:
+    """
+    The memory the process holds right now in bytes, `None` if it can't be
+    told on this system.
+    """
+    try:
+        from psutil import Process
+    except ImportError:
+        pass
+    else:
+        return Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    from resource import getpagesize
+
+    return pages * getpagesize()
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    Times the block in it as the phase `name` when profiling, else it does
+    nothing. A name seen before is not recorded again, Eg. `app.py` is run
+    once more when `chatbot.py` imports it.
+    """
+    if PROFILE_FOLDER is None:
+        yield
+        return
+    rss_before, start = rss(), perf_counter()
+    try:
+        yield
+    finally:
+        end, rss_after = perf_counter(), rss()
+        with _lock:
+            if all(done["name"] != name for done in PHASES):
+                PHASES.append(
+                    {
+                        "name": name,
+                        "thread": current_thread().name,
+                        "start": start - STARTED,
+                        "seconds": end - start,
+                        "rss_before": rss_before,
+                        "rss_after": rss_after,
+                    }
+                )
+
+
+def mark(milestone: str) -> None:
+    """
+    Records how long after the start a milestone was first reached, Eg.
+    "first paint" or "first answer".
+    """
+    if milestone in STARTUP_TIMES:
+        return
+    STARTUP_TIMES[milestone] = perf_counter() - STARTED
+    print(f"Startup: {milestone} after {STARTUP_TIMES[milestone]:.2f}s")
+    if PROFILE_FOLDER is not None:
+        # Written again at every milestone, the app may never reach the last.
+        write_report(PROFILE_FOLDER)
+
+
+def warmed(path: str, cold: float, warm: float) -> None:
+    """
+    Records how long the cold and the warm call of an inference path took at
+    the warm-up, in seconds.
+    """
+    WARMUP_TIMES[path] = {"cold": cold, "warm": warm}
+    print(f"Warm-up: {path} {cold * 1000:.1f}ms cold, {warm * 1000:.1f}ms warm")
+
+
+def traced(name: str, path: List[dict]) -> None:
+    """
+    Records the critical path of the steps `name` ran, see
+    `orchestrator.Orchestrator.critical_path`.
+    """
+    CRITICAL_PATHS[name] = path
+    steps = " -> ".join(f"{step['name']} {step['seconds']:.2f}s" for step in path)
+    print(f"Critical path of {name}: {steps}")
+    if PROFILE_FOLDER is not None:
+        write_report(PROFILE_FOLDER)
+
+
+def chose_backend(name: str, timings: Optional[dict] = None) -> None:
+    """
+    Records the backend of the model, and the timings of all of them if it
+    was chosen by timing them, see `backends.choose_backend`.
+    """
+    BACKEND.update(name=name, timings=timings or {})
+    print(f"Running the model with the {name} backend.")
+
+
+def write_report(folder: str) -> None:
+    """
+    Writes the phases and milestones so far to `startup_profile.json` and
+    `startup_profile.txt` in the folder.
+    """
+    with _lock:
+        phases = sorted(PHASES, key=lambda done: done["start"])
+    report = {
+        "recorded_at": time(),
+        "python": python_version(),
+        "platform": platform(),
+        "argv": sys.argv,
+        "milestones": dict(STARTUP_TIMES),
+        "phases": phases,
+        "warmup": dict(WARMUP_TIMES),
+        "critical_paths": dict(CRITICAL_PATHS),
+        "backend": dict(BACKEND),
+    }
+    with open(join(folder, "startup_profile.json"), "w") as file:
+        dump(report, file, indent=2)
+
+    def mb(size: Optional[int]) -> str:
+        return "?" if size is None else f"{size / 2**20:.1f}"
+
+    lines = [
+        f"{'phase':<32} {'thread':<12} {'at (s)':>7} {'took (s)':>9} {'+MB':>7} {'MB':>7}"
+    ]
+    for done in phases:
+        grown = (
+            None
+            if done["rss_before"] is None or done["rss_after"] is None
+            else done["rss_after"] - done["rss_before"]
+        )
+        lines.append(
+            f"{done['name']:<32} {done['thread'][:12]:<12} {done['start']:>7.2f} "
+            f"{done['seconds']:>9.3f} {mb(grown):>7} {mb(done['rss_after']):>7}"
+        )
+    lines.append("")
+    for milestone, seconds in STARTUP_TIMES.items():
+        lines.append(f"{milestone:<32} {seconds:>7.2f}s")
+    if WARMUP_TIMES:
+        lines.append("")
+        lines.append(f"{'warm-up':<32} {'cold (ms)':>9} {'warm (ms)':>9}")
+    for path, took in WARMUP_TIMES.items():
+        lines.append(
+            f"{path:<32} {took['cold'] * 1000:>9.1f} {took['warm'] * 1000:>9.1f}"
+        )
+    if BACKEND:
+        lines.append("")
+        lines.append(f"backend {BACKEND['name']}")
+    for name, took in BACKEND.get("timings", {}).items():
+        if "error" in took:
+            # It failed to predict and was left out, see `choose_backend`.
+            lines.append(f"  {name:<30} failed: {took['error']}")
+            continue
+        agrees = "agrees" if took["agrees"] else "disagrees"
+        lines.append(f"  {name:<30} {took['ms']:>9.3f} ms {agrees}")
+    for name, path in CRITICAL_PATHS.items():
+        lines.append("")
+        lines.append(f"critical path of {name}")
+        for step in path:
+            lines.append(
+                f"  {step['name']:<30} {step['thread'][:12]:<12} "
+                f"{step['start']:>7.2f} {step['seconds']:>9.3f}"
+            )
+    with open(join(folder, "startup_profile.txt"), "w") as file:
+        file.write("\n".join(lines) + "\n")
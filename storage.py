@@ -0,0 +1,1389 @@
+"""
+Everything that reads or writes `data/SideData.sqlite3` goes through this
+module. The schema is versioned with `PRAGMA user_version`, every entry of
+`MIGRATIONS` moves the database one version ahead, so an old database file
+is upgraded in place the first time the app opens it.
+"""
+
+import atexit
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import islice
+from json import dumps, loads
+from os import makedirs
+from os.path import abspath, dirname, exists, getsize, join
+from pickle import load as pkload
+from queue import Empty, Queue
+from re import compile
+from sqlite3 import Connection, OperationalError, connect
+from threading import Event, Lock, Thread, Timer, local
+from time import monotonic
+from traceback import print_exc
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+from pytz import country_names, country_timezones
+
+DB_PATH = "data/SideData.sqlite3"
+# Where `UserStores` keeps a database for each user.
+USERS_DIR = "data/users"
+USER_re = compile(r"\w[\w.-]{0,63}")
+NOTES_PAGE_SIZE = 20
+NOTES_SEARCH_LIMIT = 50
+NOTES_BATCH_SIZE = 1000
+# The most note pages `Storage.notes_page` keeps in memory.
+NOTES_CACHE_PAGES = 32
+TODOS_PAGE_SIZE = 5
+HISTORY_PAGE_SIZE = 20
+# The queued writes are committed together every `FLUSH_INTERVAL` seconds,
+# or as soon as `WRITE_BATCH_SIZE` of them are waiting.
+FLUSH_INTERVAL = 0.1
+WRITE_BATCH_SIZE = 64
+# A burst of settings changes is written once, this long after the first.
+SETTINGS_FLUSH_DELAY = 0.5
+_STOP = object()  # Put on the write queue to stop the writer.
+# The longest one run of `Storage.maintain` may take, in seconds.
+MAINTENANCE_BUDGET = 2.0
+# How long a connection waits for a lock held by another, in seconds.
+BUSY_TIMEOUT = 10
+# The bytes the WAL file is cut back to after a checkpoint.
+WAL_SIZE_LIMIT = 1 << 20
+# The lookups the app does all the time, `Storage.maintain` reports the ones
+# the planner stops serving from an index.
+PLAN_CHECKS = {
+    "notes page": "SELECT id FROM notes WHERE (unix_ts, id) < (0, 0) "
+    "ORDER BY unix_ts DESC, id DESC LIMIT 20;",
+    "city": "SELECT country_code FROM cities WHERE lower(name) = 'delhi';",
+    "zones": "SELECT name FROM zones WHERE country_code = 'IN' ORDER BY id;",
+    "to-dos page": "SELECT id FROM todos WHERE done = 0 AND priority = 1 "
+    "AND ifnull(due_ts, 9e999) > 0 ORDER BY priority, ifnull(due_ts, 9e999), id "
+    "LIMIT 5;",
+    "birthdays": "SELECT name FROM birthdays WHERE month = 1 AND day = 1;",
+    "history page": "SELECT id FROM history WHERE id < 100 ORDER BY id DESC LIMIT 20;",
+}
+
+
+def _fix_encoding(name: str) -> str:
+    # Some of the city names were saved as utf-8 bytes read back as latin-1,
+    # (Eg. "cÃ³rdoba"), decoding them once more gives the real name.
+    try:
+        return name.encode("latin-1").decode("utf-8")
+    except UnicodeError:
+        return name
+
+
+def _create_notes(conn: Connection) -> None:
+    """
+    The notes table as `data/DataMake.py` used to create it. Older databases
+    already have it.
+    """
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS notes("
+        " title varchar(20) NOT NULL,"
+        " description varchar(200) NOT NULL,"
+        " unix_ts numeric NOT NULL);"
+    )
+
+
+def _migrate_places(conn: Connection) -> None:
+    """
+    Replaces the `timezones` table, which kept all the cities of a country
+    comma-joined in a single `country_city` column, with three normalized
+    tables. Names are indexed on `lower(name)` so that the lookups in
+    `find_place` never have to scan.
+
+    A user's own database reads the places of the shared one attached as
+    `places`, so it gets none of its own.
+    """
+    if any(row[1] == "places" for row in conn.execute("PRAGMA database_list;")):
+        return
+    # `executescript` would commit the transaction `migrate` opened, so the
+    # statements are run one by one.
+    for statement in (
+        "CREATE TABLE countries(code TEXT PRIMARY KEY, name TEXT NOT NULL);",
+        "CREATE TABLE cities("
+        " id INTEGER PRIMARY KEY,"
+        " name TEXT NOT NULL,"
+        " country_code TEXT NOT NULL REFERENCES countries(code));",
+        "CREATE TABLE zones("
+        " id INTEGER PRIMARY KEY,"
+        " country_code TEXT NOT NULL REFERENCES countries(code),"
+        " name TEXT NOT NULL);",
+        "CREATE INDEX countries_name_idx ON countries(lower(name));",
+        "CREATE INDEX cities_name_idx ON cities(lower(name));",
+        "CREATE INDEX cities_country_idx ON cities(country_code);",
+        "CREATE INDEX zones_country_idx ON zones(country_code);",
+    ):
+        conn.execute(statement)
+    has_old_table = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'timezones';"
+    ).fetchone()
+    if has_old_table:
+        rows = conn.execute(
+            "SELECT country_code, country_city FROM timezones;"
+        ).fetchall()
+    else:
+        rows = [(code, None) for code in country_names]
+    countries, cities, zones = [], [], []
+    for code, joined_cities in rows:
+        code = code.lower()
+        if code.upper() not in country_names:
+            continue
+        countries.append((code, country_names[code.upper()]))
+        for tz in country_timezones.get(code.upper(), []):
+            zones.append((code, tz))
+        for city in (joined_cities or "").split(","):
+            # A bracketed hint like "mumbai (bombay)" is an old name, it is
+            # kept as a city of its own. The two letter states of "dallas
+            # (tx)" are dropped, they are ambiguous with the country codes.
+            city, _, hint = city.partition("(")
+            hint = hint.strip(" )")
+            for name in [city] if len(hint) <= 2 else [city, hint]:
+                name = _fix_encoding(name.strip())
+                if name:
+                    cities.append((name, code))
+    conn.executemany("INSERT INTO countries VALUES (?, ?);", countries)
+    # The same hint can come with more than one city, Eg. "(jiangxi)".
+    conn.executemany(
+        "INSERT INTO cities(name, country_code) VALUES (?, ?);",
+        list(dict.fromkeys(cities)),
+    )
+    conn.executemany("INSERT INTO zones(country_code, name) VALUES (?, ?);", zones)
+    conn.execute("DROP TABLE IF EXISTS timezones;")
+
+
+def _migrate_notes_keys(conn: Connection) -> None:
+    """
+    Gives every note an `id` to be deleted by, and indexes `unix_ts`
+    so that the notes can be listed page by page, newest first.
+    """
+    for statement in (
+        "CREATE TABLE notes_new("
+        " id INTEGER PRIMARY KEY,"
+        " title varchar(20) NOT NULL,"
+        " description varchar(200) NOT NULL,"
+        " unix_ts numeric NOT NULL);",
+        "INSERT INTO notes_new(title, description, unix_ts)"
+        " SELECT title, description, unix_ts FROM notes ORDER BY unix_ts;",
+        "DROP TABLE notes;",
+        "ALTER TABLE notes_new RENAME TO notes;",
+        "CREATE INDEX notes_ts_idx ON notes(unix_ts);",
+    ):
+        conn.execute(statement)
+
+
+def _create_notes_search(conn: Connection) -> None:
+    """
+    Adds a full-text index over the title and description of the notes.
+    It is an external content FTS5 table, so the text is not stored twice,
+    and the triggers keep it in sync with every write to `notes`.
+    """
+    for statement in (
+        "CREATE VIRTUAL TABLE notes_fts USING fts5("
+        " title, description, content='notes', content_rowid='id',"
+        " tokenize='unicode61 remove_diacritics 2', prefix='2 3');",
+        "CREATE TRIGGER notes_fts_insert AFTER INSERT ON notes BEGIN"
+        " INSERT INTO notes_fts(rowid, title, description)"
+        " VALUES (new.id, new.title, new.description);"
+        " END;",
+        "CREATE TRIGGER notes_fts_delete AFTER DELETE ON notes BEGIN"
+        " INSERT INTO notes_fts(notes_fts, rowid, title, description)"
+        " VALUES ('delete', old.id, old.title, old.description);"
+        " END;",
+        "CREATE TRIGGER notes_fts_update AFTER UPDATE ON notes BEGIN"
+        " INSERT INTO notes_fts(notes_fts, rowid, title, description)"
+        " VALUES ('delete', old.id, old.title, old.description);"
+        " INSERT INTO notes_fts(rowid, title, description)"
+        " VALUES (new.id, new.title, new.description);"
+        " END;",
+        "INSERT INTO notes_fts(notes_fts) VALUES ('rebuild');",
+    ):
+        conn.execute(statement)
+
+
+def _create_todos(conn: Connection) -> None:
+    """
+    The to-do list. Priority 1 is high, 2 normal and 3 low, so that open
+    to-dos list in one ascending index order: most urgent priority first,
+    then the earliest due time, the ones without a due time last.
+    """
+    for statement in (
+        "CREATE TABLE todos("
+        " id INTEGER PRIMARY KEY,"
+        " title varchar(50) NOT NULL,"
+        " done INTEGER NOT NULL DEFAULT 0,"
+        " priority INTEGER NOT NULL DEFAULT 2,"
+        " due_ts numeric,"
+        " created_ts numeric NOT NULL);",
+        "CREATE INDEX todos_list_idx"
+        " ON todos(done, priority, ifnull(due_ts, 9e999), id);",
+        "CREATE INDEX todos_due_idx ON todos(due_ts)"
+        " WHERE done = 0 AND due_ts IS NOT NULL;",
+    ):
+        conn.execute(statement)
+
+
+def _create_birthdays(conn: Connection) -> None:
+    """
+    Birthdays by month and day, so the ones of a day are one index lookup.
+    """
+    for statement in (
+        "CREATE TABLE birthdays("
+        " name varchar(50) PRIMARY KEY,"
+        " month INTEGER NOT NULL,"
+        " day INTEGER NOT NULL);",
+        "CREATE INDEX birthdays_day_idx ON birthdays(month, day);",
+    ):
+        conn.execute(statement)
+
+
+def _create_settings(conn: Connection) -> None:
+    """
+    One key-value table for the app settings, the values are JSON. The old
+    `username.pkl` and `API.pkl` next to the database are moved in here.
+    """
+    conn.execute(
+        "CREATE TABLE settings(key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;"
+    )
+    folder = dirname(conn.execute("PRAGMA database_list;").fetchone()[2])
+    settings = {}
+    try:
+        with open(join(folder, "username.pkl"), "rb") as file:
+            settings["user_name"] = pkload(file)
+    except FileNotFoundError:
+        pass
+    try:
+        with open(join(folder, "API.pkl"), "rb") as file:
+            settings["speech_api_key"], settings["speech_api_location"] = pkload(file)
+    except FileNotFoundError:
+        pass
+    conn.executemany(
+        "INSERT INTO settings(key, value) VALUES (?, ?);",
+        [(key, dumps(value)) for key, value in settings.items()],
+    )
+
+
+def _create_history(conn: Connection) -> None:
+    """
+    Every message of the chat. The ids only grow, so the messages are paged
+    by id straight off the table's own b-tree, no other index is needed.
+    """
+    conn.execute(
+        "CREATE TABLE history("
+        " id INTEGER PRIMARY KEY,"
+        " from_user INTEGER NOT NULL,"
+        " text TEXT NOT NULL,"
+        " unix_ts numeric NOT NULL);"
+    )
+
+
+# The index of a migration plus one is the `user_version` it leaves behind.
+MIGRATIONS = [
+    _create_notes,
+    _migrate_places,
+    _migrate_notes_keys,
+    _create_notes_search,
+    _create_todos,
+    _create_birthdays,
+    _create_settings,
+    _create_history,
+]
+
+
+def migrate(conn: Connection) -> None:
+    """
+    Runs all the migrations the database has not seen yet. Each one runs
+    in its own transaction together with the version bump, so a crash in
+    between never leaves a half migrated file.
+    """
+    version = conn.execute("PRAGMA user_version;").fetchone()[0]
+    for number, step in enumerate(MIGRATIONS[version:], version + 1):
+        conn.execute("BEGIN;")
+        try:
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {number};")
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+class _WriteBehind(Thread):
+    """
+    Commits the queued writes of a `Storage` on its own thread. The writes
+    that come in together are grouped in one transaction, which is
+    committed once `batch_size` writes are in or `flush_interval` seconds
+    have passed since the first one, so a burst of writes costs one commit
+    instead of one each.
+    """
+
+    def __init__(self, storage: "Storage", flush_interval: float, batch_size: int):
+        super().__init__(name="storage-writer", daemon=True)
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.queue = Queue()
+
+    def run(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            deadline = monotonic() + self.flush_interval
+            # A flush request or the stop marker commits right away.
+            while len(batch) < self.batch_size and isinstance(batch[-1], tuple):
+                timeout = deadline - monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except Empty:
+                    break
+            writes = [item for item in batch if isinstance(item, tuple)]
+            try:
+                if writes:
+                    self._commit(writes)
+            finally:
+                # A `flush` waiting on this batch must not wait forever.
+                for item in batch:
+                    if isinstance(item, Event):
+                        item.set()
+            if _STOP in batch:
+                return
+
+    def _commit(self, writes: List[tuple]) -> None:
+        results = []
+        with self.storage.connect() as conn:
+            try:
+                conn.execute("BEGIN;")
+                for sql, params, _ in writes:
+                    results.append((conn.execute(sql, params).lastrowid, None))
+                conn.commit()
+            except Exception:
+                # Something in the batch failed, so each write is retried
+                # in its own transaction to know which one it was.
+                conn.rollback()
+                results = []
+                for sql, params, _ in writes:
+                    try:
+                        with conn:
+                            results.append((conn.execute(sql, params).lastrowid, None))
+                    except Exception as err:
+                        results.append((None, err))
+        for (_, _, callback), (result, error) in zip(writes, results):
+            if callback is not None:
+                try:
+                    callback(result, error)
+                except Exception:
+                    # One broken callback must not stop the writer.
+                    print_exc()
+
+
+class Settings:
+    """
+    The app settings, Eg. the user name. They are read once when the storage
+    opens and served from memory after that. Setting one returns right away,
+    the changes are written together `delay` seconds later, in one
+    transaction, so they land all or none.
+    """
+
+    def __init__(self, storage: "Storage", delay: float = SETTINGS_FLUSH_DELAY):
+        self.storage = storage
+        self.delay = delay
+        self._lock = Lock()
+        # Held through a whole flush, so an older flush can never land after
+        # a newer one.
+        self._flush_lock = Lock()
+        self._dirty = {}
+        self._timer: Optional[Timer] = None
+        with storage.connect() as conn:
+            self._values = {
+                key: loads(value)
+                for key, value in conn.execute("SELECT key, value FROM settings;")
+            }
+
+    def __getitem__(self, key: str) -> Any:
+        return self._values[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._values.get(key, default)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        # Dumped here so a value JSON can't hold fails for the caller.
+        text = dumps(value)
+        with self._lock:
+            self._values[key] = value
+            self._dirty[key] = text
+            if self._timer is None:
+                self._timer = Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def update(self, **values: Any) -> None:
+        for key, value in values.items():
+            self[key] = value
+
+    def flush(self) -> None:
+        """
+        Writes the pending changes now.
+        """
+        with self._flush_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, {}
+                timer, self._timer = self._timer, None
+            if timer is not None:
+                timer.cancel()
+            if dirty:
+                with self.storage.connect() as conn, conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO settings(key, value) VALUES (?, ?);",
+                        dirty.items(),
+                    )
+
+
+class Storage:
+    """
+    The storage layer of the chatbot. The chatbot functions are called from
+    the `Chatbot_Worker` threads and from the Qt button callbacks on the GUI
+    thread, while a `sqlite3.Connection` must only be used by one thread at
+    a time. So every thread borrows its own connection from a small pool
+    with `connect`, and gives it back when done.
+
+    The database runs in WAL mode, so the readers (listing notes, looking
+    up places) never wait for a writer (creating a note) and the other way
+    round. `synchronous = NORMAL` is safe with WAL, it only syncs at the
+    checkpoints instead of at every commit.
+    """
+
+    def __init__(
+        self,
+        path: str = DB_PATH,
+        pool_size: int = 4,
+        flush_interval: float = FLUSH_INTERVAL,
+        write_batch_size: int = WRITE_BATCH_SIZE,
+        places_path: Optional[str] = None,
+    ) -> None:
+        self.path = path
+        # The shared database to read the places from, see `UserStores`.
+        self.places_path = places_path
+        self.pool_size = pool_size
+        self._idle: List[Connection] = []
+        self._lock = Lock()
+        self._local = local()
+        self._notes_count: Optional[int] = None
+        self._notes_version = 0
+        # The recently fetched note pages by `(key, older, limit)`, oldest
+        # used first, see `notes_page`.
+        self._note_pages: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._cache_lock = Lock()
+        self._cache_hits = {"note_pages": 0, "notes_count": 0}
+        self._cache_misses = {"note_pages": 0, "notes_count": 0}
+        self._todos_count: Optional[int] = None
+        self._todos_version = 0
+        with self.connect() as conn:
+            migrate(conn)
+        self.settings = Settings(self)
+        self._writer = _WriteBehind(self, flush_interval, write_batch_size)
+        self._writer.start()
+        # The queued writes must reach the disk even if `close` is never
+        # called, Eg. when the app is killed with Ctrl+C.
+        atexit.register(self.close)
+
+    def _open(self) -> Connection:
+        # Connections move between threads through the pool, but only ever
+        # one thread holds them, hence `check_same_thread=False`.
+        if self.places_path is None:
+            conn = connect(
+                self.path,
+                timeout=BUSY_TIMEOUT,
+                check_same_thread=False,
+                cached_statements=128,
+            )
+        else:
+            # Opened by URI, so that the places can be attached read-only.
+            conn = connect(
+                "file:" + quote(abspath(self.path)),
+                timeout=BUSY_TIMEOUT,
+                check_same_thread=False,
+                cached_statements=128,
+                uri=True,
+            )
+            conn.execute(
+                "ATTACH DATABASE ? AS places;",
+                ("file:" + quote(abspath(self.places_path)) + "?mode=ro",),
+            )
+        # Only takes effect on a new file, `maintain` converts an old one.
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL;")
+        conn.execute("PRAGMA journal_mode = WAL;")
+        conn.execute("PRAGMA synchronous = NORMAL;")
+        # The WAL is cut back to this after a checkpoint, instead of staying
+        # as large as the largest burst of writes.
+        conn.execute(f"PRAGMA journal_size_limit = {WAL_SIZE_LIMIT};")
+        return conn
+
+    @contextmanager
+    def connect(self) -> Iterator[Connection]:
+        """
+        Lends a connection to the calling thread. Nested calls on the same
+        thread get the same connection back.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+            return
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._open()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                if len(self._idle) < self.pool_size:
+                    self._idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    def write(
+        self,
+        sql: str,
+        params: tuple = (),
+        callback: Optional[Callable[[Optional[int], Optional[Exception]], None]] = None,
+    ) -> None:
+        """
+        Queues a write and returns right away, the write-behind thread
+        commits it together with the other writes around it.
+
+        Args:
+            sql (str): The statement to run.
+            params (tuple): Its parameters.
+            callback (Optional[Callable]): Called on the writer thread once
+            the write is committed, with the `lastrowid` and `None`, or with
+            `None` and the error if it failed.
+        """
+        if not self._writer.is_alive():
+            raise RuntimeError("The storage is closed.")
+        self._writer.queue.put((sql, params, callback))
+
+    def flush(self) -> None:
+        """
+        Blocks until every write queued so far is committed.
+        """
+        if self._writer.is_alive():
+            done = Event()
+            self._writer.queue.put(done)
+            done.wait()
+
+    def close(self) -> None:
+        """
+        Commits the queued writes, stops the writer and closes all the idle
+        connections of the pool. Calling it again does nothing.
+        """
+        self.settings.flush()
+        if self._writer.is_alive():
+            self._writer.queue.put(_STOP)
+            self._writer.join()
+        atexit.unregister(self.close)
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def health(self) -> dict:
+        """
+        How the database file is doing: its size on disk with the WAL, the
+        free pages waiting to be given back and the `PLAN_CHECKS` that no
+        longer use an index (a full scan or a sort).
+        """
+        size = getsize(self.path)
+        if exists(self.path + "-wal"):
+            size += getsize(self.path + "-wal")
+        with self.connect() as conn:
+            free_pages = conn.execute("PRAGMA freelist_count;").fetchone()[0]
+            slow = []
+            for name, sql in PLAN_CHECKS.items():
+                for *_, detail in conn.execute("EXPLAIN QUERY PLAN " + sql):
+                    if "TEMP B-TREE" in detail or (
+                        detail.startswith("SCAN") and "INDEX" not in detail
+                    ):
+                        slow.append(name)
+                        break
+        return {"size": size, "free_pages": free_pages, "slow_plans": slow}
+
+    def maintain(
+        self, budget: float = MAINTENANCE_BUDGET, stop: Optional[Event] = None
+    ) -> dict:
+        """
+        Tidies the database: refreshes the planner statistics, gives the free
+        pages of deleted rows back to the disk, checkpoints the WAL and
+        checks the file for corruption. The work is cut off once `budget`
+        seconds are up or `stop` is set, what is left is done the next time.
+
+        Args:
+            budget (float): The most seconds to spend.
+            stop (Optional[Event]): Set it to stop right away, Eg. when the
+            user starts chatting again.
+
+        Returns:
+            dict: The `health` before and after, the steps done and the
+            result of the integrity check, `None` if it did not run.
+        """
+        deadline = monotonic() + budget
+
+        def out_of_time() -> bool:
+            return monotonic() > deadline or (stop is not None and stop.is_set())
+
+        report = {"before": self.health(), "done": [], "integrity": None}
+        with self.connect() as conn:
+            converted = conn.execute("PRAGMA auto_vacuum;").fetchone()[0] == 2
+
+            def incremental_vacuum():
+                while conn.execute("PRAGMA freelist_count;").fetchone()[0]:
+                    conn.execute("PRAGMA incremental_vacuum(256);").fetchall()
+
+            def checkpoint():
+                # TRUNCATE also empties the WAL file, the vacuum above wrote
+                # the whole database into it. It waits for the readers and
+                # the writer, but no longer than the budget left.
+                left = max(deadline - monotonic(), 0)
+                conn.execute(f"PRAGMA busy_timeout = {int(left * 1000)};")
+                try:
+                    conn.execute("PRAGMA wal_checkpoint(TRUNCATE);").fetchall()
+                finally:
+                    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT * 1000};")
+
+            def integrity_check():
+                rows = conn.execute("PRAGMA integrity_check(20);").fetchall()
+                report["integrity"] = [row[0] for row in rows]
+
+            steps = [
+                # A file from before `auto_vacuum` needs one full vacuum.
+                ("vacuum", None if converted else lambda: conn.execute("VACUUM;")),
+                # Only `main`, the attached places of a user store are read-only.
+                (
+                    "optimize",
+                    lambda: (
+                        conn.execute("PRAGMA analysis_limit = 400;"),
+                        conn.execute("PRAGMA main.optimize;"),
+                    ),
+                ),
+                ("incremental vacuum", incremental_vacuum),
+                ("checkpoint", checkpoint),
+                ("integrity check", integrity_check),
+            ]
+            # SQLite calls this every 1000 steps of a statement, returning
+            # True interrupts the statement.
+            conn.set_progress_handler(out_of_time, 1000)
+            try:
+                for name, step in steps:
+                    if step is None:
+                        continue
+                    if out_of_time():
+                        break
+                    try:
+                        step()
+                    except OperationalError as err:
+                        if conn.in_transaction:
+                            conn.rollback()
+                        if "interrupted" in str(err):
+                            break
+                        # Eg. the database is busy, the next steps may still go.
+                        continue
+                    report["done"].append(name)
+            finally:
+                conn.set_progress_handler(None, 0)
+        report["after"] = self.health()
+        return report
+
+    def find_places(self, names: List[str]) -> List[Optional[Tuple[str, List[str]]]]:
+        """
+        Looks up many country codes, country names or city names at once.
+        The whole batch costs two index backed queries, no matter how many
+        places are asked for.
+
+        Args:
+            names (List[str]): The places user asked for.
+
+        Returns:
+            List[Optional[Tuple[str, List[str]]]]: For every name, in the same
+            order, the country name with all of its timezones or `None` if the
+            place is not known.
+        """
+        if not names:
+            return []
+        asked = ", ".join(["(?, ?)"] * len(names))
+        params = []
+        for pos, name in enumerate(names):
+            params += [pos, name.strip().lower()]
+        with self.connect() as conn:
+            rows = conn.execute(
+                f"WITH asked(pos, p) AS (VALUES {asked}) "
+                "SELECT asked.pos, 0, code, name FROM asked "
+                "JOIN countries ON code = asked.p OR lower(name) = asked.p "
+                "UNION ALL "
+                "SELECT asked.pos, 1, countries.code, countries.name FROM asked "
+                "JOIN cities ON lower(cities.name) = asked.p "
+                "JOIN countries ON countries.code = cities.country_code "
+                "ORDER BY 1, 2;",
+                params,
+            ).fetchall()
+            # Countries are ordered before cities, so the first row of each
+            # position wins, just like `UNION ALL ... LIMIT 1` for one place.
+            found = {}
+            for pos, _, code, name in rows:
+                found.setdefault(pos, (code, name))
+            codes = list({code for code, _ in found.values()})
+            zones = {code: [] for code in codes}
+            if codes:
+                for code, zone in conn.execute(
+                    "SELECT country_code, name FROM zones WHERE country_code "
+                    f"IN ({', '.join(['?'] * len(codes))}) ORDER BY id;",
+                    codes,
+                ):
+                    zones[code].append(zone)
+        return [
+            (found[pos][1], zones[found[pos][0]]) if pos in found else None
+            for pos in range(len(names))
+        ]
+
+    def find_place(self, name: str) -> Optional[Tuple[str, List[str]]]:
+        """
+        Looks up a country code, country name or city name.
+
+        Args:
+            name (str): The place user asked for.
+
+        Returns:
+            Optional[Tuple[str, List[str]]]: The country name with all of its
+            timezones, or `None` if the place is not known.
+        """
+        return self.find_places([name])[0]
+
+    def add_city(self, name: str, country_code: str) -> None:
+        with self.connect() as conn, conn:
+            conn.execute(
+                "INSERT INTO cities(name, country_code) VALUES (?, ?);",
+                (name.strip(), country_code.lower()),
+            )
+
+    def _notes_written(
+        self,
+        callback: Optional[Callable] = None,
+        unix_ts: Optional[float] = None,
+        deleted: Optional[int] = None,
+    ) -> Callable:
+        # Wraps the callback of a note write to drop the cached count and
+        # the cached pages the write changes first. Pass the `unix_ts` of
+        # an added note or the id of a `deleted` one, neither drops every
+        # page.
+        def written(result: Optional[int], error: Optional[Exception]) -> None:
+            with self._cache_lock:
+                self._notes_count, self._notes_version = None, self._notes_version + 1
+                if error is None:
+                    for cache_key, page in list(self._note_pages.items()):
+                        if self._page_changed(
+                            cache_key, page, unix_ts, result, deleted
+                        ):
+                            del self._note_pages[cache_key]
+            if callback is not None:
+                callback(result, error)
+
+        return written
+
+    @staticmethod
+    def _page_changed(
+        cache_key: tuple,
+        page: tuple,
+        unix_ts: Optional[float],
+        note_id: Optional[int],
+        deleted: Optional[int],
+    ) -> bool:
+        # Whether adding the note `(unix_ts, note_id)` or deleting the note
+        # with the id `deleted` changes a cached page.
+        if deleted is not None:
+            # A note not on the page is before its key or after a full page.
+            return any(note[0] == deleted for note in page)
+        if unix_ts is None:
+            return True
+        key, older, limit = cache_key
+        note = (unix_ts, note_id)
+        # The pages of newer notes are reversed, the note farthest from the
+        # key is the first then.
+        farthest = page[-1 if older else 0] if page else None
+        if older:
+            after_key = key is None or note < key
+            past_page = len(page) == limit and note < (farthest[3], farthest[0])
+        else:
+            after_key = key is None or note > key
+            past_page = len(page) == limit and note > (farthest[3], farthest[0])
+        return after_key and not past_page
+
+    def add_note(
+        self,
+        title: str,
+        description: str,
+        unix_ts: float,
+        callback: Optional[Callable[[Optional[int], Optional[Exception]], None]] = None,
+    ) -> None:
+        """
+        Queues a note to be saved, see `write`. The callback gets the id of
+        the note.
+        """
+        self.write(
+            "INSERT INTO notes(title, description, unix_ts) VALUES (?, ?, ?);",
+            (title, description, unix_ts),
+            self._notes_written(callback, unix_ts=unix_ts),
+        )
+
+    def notes_page(
+        self,
+        key: Optional[Tuple[float, int]] = None,
+        older: bool = True,
+        limit: int = NOTES_PAGE_SIZE,
+    ) -> List[Tuple[int, str, str, float]]:
+        """
+        Fetches a page of notes. Instead of an `OFFSET`, which would have to
+        walk over every skipped note, a page starts right next to the
+        `(unix_ts, id)` of a note already seen. So every page costs one
+        index seek, however many notes there are.
+
+        Args:
+            key (Optional[Tuple[float, int]]): The `(unix_ts, id)` of the
+            note to start next to. `None` starts from the newest note, or
+            from the oldest one if `older` is `False`.
+            older (bool): Whether to fetch the notes older or newer than `key`.
+            limit (int): The most notes to return.
+
+        Returns:
+            List[Tuple[int, str, str, float]]: `(id, title, description,
+            unix_ts)` of the notes, newest first.
+        """
+        # Pages are served from memory until a note write changes them, so
+        # opening the viewer again never touches the database.
+        cache_key = (None if key is None else tuple(key), older, limit)
+        with self._cache_lock:
+            cached = self._note_pages.get(cache_key)
+            if cached is not None:
+                self._note_pages.move_to_end(cache_key)
+                self._cache_hits["note_pages"] += 1
+                return list(cached)
+            self._cache_misses["note_pages"] += 1
+            version = self._notes_version
+        where = (
+            ""
+            if key is None
+            else f"WHERE (unix_ts, id) {'<' if older else '>'} (?, ?) "
+        )
+        order = "DESC" if older else "ASC"
+        with self.connect() as conn:
+            page = conn.execute(
+                "SELECT id, title, description, unix_ts FROM notes "
+                f"{where}ORDER BY unix_ts {order}, id {order} LIMIT ?;",
+                (*(key or ()), limit),
+            ).fetchall()
+        if not older:
+            page.reverse()
+        with self._cache_lock:
+            # A note written meanwhile may have changed the page already.
+            if version == self._notes_version:
+                self._note_pages[cache_key] = tuple(page)
+                while len(self._note_pages) > NOTES_CACHE_PAGES:
+                    self._note_pages.popitem(last=False)
+        return page
+
+    def notes_count(self) -> int:
+        """
+        Counts the notes. The count is cached until the next write, because
+        `COUNT(*)` has to walk the whole table.
+        """
+        with self._cache_lock:
+            count, version = self._notes_count, self._notes_version
+            if count is not None:
+                self._cache_hits["notes_count"] += 1
+                return count
+            self._cache_misses["notes_count"] += 1
+        with self.connect() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM notes;").fetchone()[0]
+        with self._cache_lock:
+            # A note written meanwhile makes this count stale already.
+            if version == self._notes_version:
+                self._notes_count = count
+        return count
+
+    def cache_stats(self) -> dict:
+        """
+        How well the in-memory caches do, for each of them the hits, the
+        misses and the hit rate. The settings are all in memory, see
+        `Settings`.
+        """
+        with self._cache_lock:
+            stats = {}
+            for name, hits in self._cache_hits.items():
+                misses = self._cache_misses[name]
+                stats[name] = {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                }
+            stats["note_pages"]["size"] = len(self._note_pages)
+        return stats
+
+    def iter_notes(
+        self, batch_size: int = NOTES_BATCH_SIZE
+    ) -> Iterator[Tuple[str, str, float]]:
+        """
+        Yields the `(title, description, unix_ts)` of every note, oldest
+        first. Notes are read a batch at a time with keyset pagination,
+        so only one batch is ever held in memory.
+        """
+        key = (float("-inf"), 0)
+        while True:
+            with self.connect() as conn:
+                batch = conn.execute(
+                    "SELECT id, title, description, unix_ts FROM notes "
+                    "WHERE (unix_ts, id) > (?, ?) ORDER BY unix_ts, id LIMIT ?;",
+                    (*key, batch_size),
+                ).fetchall()
+            if not batch:
+                return
+            for _, title, description, unix_ts in batch:
+                yield title, description, unix_ts
+            key = batch[-1][3], batch[-1][0]
+
+    def import_notes(
+        self,
+        notes: Iterable[Tuple[str, str, float]],
+        batch_size: int = NOTES_BATCH_SIZE,
+    ) -> int:
+        """
+        Saves the `(title, description, unix_ts)` of many notes. They are
+        taken from the iterable a batch at a time and each batch is written
+        with one `executemany` in one transaction, so a file of any size
+        can be streamed in.
+
+        Returns:
+            int: The count of notes saved.
+        """
+        notes = iter(notes)
+        count = 0
+        while True:
+            batch = list(islice(notes, batch_size))
+            if not batch:
+                break
+            with self.connect() as conn, conn:
+                conn.executemany(
+                    "INSERT INTO notes(title, description, unix_ts) VALUES (?, ?, ?);",
+                    batch,
+                )
+            count += len(batch)
+            self._notes_written()(None, None)
+        return count
+
+    def search_notes(
+        self, words: List[str], limit: int = NOTES_SEARCH_LIMIT
+    ) -> List[Tuple[int, str, str, float]]:
+        """
+        Full-text search over the notes. A note matches if it has any of the
+        words, or a word starting with them, and the best matches come
+        first. Words in the title weigh twice as much as in the description.
+
+        Args:
+            words (List[str]): The words to search for.
+            limit (int): The most notes to return.
+
+        Returns:
+            List[Tuple[int, str, str, float]]: `(id, title, description,
+            unix_ts)` of the matching notes, best match first.
+        """
+        # Every word is quoted so nothing user types is read as FTS syntax.
+        query = " OR ".join('"{}"*'.format(word.replace('"', '""')) for word in words)
+        if not query:
+            return []
+        with self.connect() as conn:
+            return conn.execute(
+                "SELECT notes.id, notes.title, notes.description, notes.unix_ts "
+                "FROM notes_fts JOIN notes ON notes.id = notes_fts.rowid "
+                "WHERE notes_fts MATCH ? "
+                "ORDER BY bm25(notes_fts, 2.0, 1.0) LIMIT ?;",
+                (query, limit),
+            ).fetchall()
+
+    def delete_note(
+        self,
+        note_id: int,
+        callback: Optional[Callable[[Optional[int], Optional[Exception]], None]] = None,
+    ) -> None:
+        """
+        Queues a note to be deleted, see `write`.
+        """
+        self.write(
+            "DELETE FROM notes WHERE id = ?;",
+            (note_id,),
+            self._notes_written(callback, deleted=note_id),
+        )
+
+    def _todos_written(self, callback: Optional[Callable] = None) -> Callable:
+        # Wraps the callback of a to-do write to drop the cached count first.
+        def written(result: Optional[int], error: Optional[Exception]) -> None:
+            self._todos_count, self._todos_version = None, self._todos_version + 1
+            if callback is not None:
+                callback(result, error)
+
+        return written
+
+    def add_todo(
+        self,
+        title: str,
+        due_ts: Optional[float],
+        priority: int,
+        created_ts: float,
+        callback: Optional[Callable[[Optional[int], Optional[Exception]], None]] = None,
+    ) -> None:
+        """
+        Queues a to-do to be saved, see `write`. The callback gets the id of
+        the to-do.
+        """
+        self.write(
+            "INSERT INTO todos(title, priority, due_ts, created_ts) "
+            "VALUES (?, ?, ?, ?);",
+            (title, priority, due_ts, created_ts),
+            self._todos_written(callback),
+        )
+
+    def todos_page(
+        self,
+        key: Optional[Tuple[int, float, int]] = None,
+        limit: int = TODOS_PAGE_SIZE,
+    ) -> List[Tuple[int, str, int, Optional[float]]]:
+        """
+        Fetches a page of the open to-dos, the most urgent first. Like
+        `notes_page` it seeks straight to the page in `todos_list_idx`.
+
+        Args:
+            key (Optional[Tuple[int, float, int]]): The `todo_key` of the
+            last to-do of the previous page, `None` for the first page.
+            limit (int): The most to-dos to return.
+
+        Returns:
+            List[Tuple[int, str, int, Optional[float]]]: `(id, title,
+            priority, due_ts)` of the to-dos.
+        """
+        select = (
+            "SELECT id, title, priority, due_ts FROM todos WHERE done = 0 {} "
+            "ORDER BY priority, ifnull(due_ts, 9e999), id LIMIT ?;"
+        )
+        with self.connect() as conn:
+            if key is None:
+                return conn.execute(select.format(""), (limit,)).fetchall()
+            # SQLite does not seek on a row value over an expression, so the
+            # rest of the page is looked up as three plain seeks: the rest of
+            # the key's due time, the rest of its priority, the priorities
+            # after it.
+            priority, due_key, todo_id = key
+            page = []
+            for condition, params in (
+                (
+                    "AND priority = ? AND ifnull(due_ts, 9e999) = ? AND id > ?",
+                    (priority, due_key, todo_id),
+                ),
+                (
+                    "AND priority = ? AND ifnull(due_ts, 9e999) > ?",
+                    (priority, due_key),
+                ),
+                ("AND priority > ?", (priority,)),
+            ):
+                page += conn.execute(
+                    select.format(condition), (*params, limit - len(page))
+                ).fetchall()
+                if len(page) == limit:
+                    break
+            return page
+
+    def open_todos_count(self) -> int:
+        """
+        Counts the open to-dos, cached until the next to-do write.
+        """
+        count, version = self._todos_count, self._todos_version
+        if count is None:
+            with self.connect() as conn:
+                count = conn.execute(
+                    "SELECT COUNT(*) FROM todos WHERE done = 0;"
+                ).fetchone()[0]
+            if version == self._todos_version:
+                self._todos_count = count
+        return count
+
+    def set_todo_done(
+        self,
+        todo_id: int,
+        done: bool = True,
+        callback: Optional[Callable[[Optional[int], Optional[Exception]], None]] = None,
+    ) -> None:
+        """
+        Queues marking a to-do done, or open again, see `write`.
+        """
+        self.write(
+            "UPDATE todos SET done = ? WHERE id = ?;",
+            (int(done), todo_id),
+            self._todos_written(callback),
+        )
+
+    def delete_todo(
+        self,
+        todo_id: int,
+        callback: Optional[Callable[[Optional[int], Optional[Exception]], None]] = None,
+    ) -> None:
+        """
+        Queues a to-do to be deleted, see `write`.
+        """
+        self.write(
+            "DELETE FROM todos WHERE id = ?;", (todo_id,), self._todos_written(callback)
+        )
+
+    def due_todos(
+        self, start: float, stop: float
+    ) -> List[Tuple[int, str, int, Optional[float]]]:
+        """
+        The open to-dos due from `start` up to `stop`, read from
+        `todos_due_idx` so the to-dos due later are never touched.
+
+        Returns:
+            List[Tuple[int, str, int, Optional[float]]]: `(id, title,
+            priority, due_ts)` of the to-dos, the earliest due first.
+        """
+        with self.connect() as conn:
+            return conn.execute(
+                # Without statistics the planner prefers `todos_list_idx`,
+                # which walks every open to-do.
+                "SELECT id, title, priority, due_ts FROM todos INDEXED BY todos_due_idx "
+                "WHERE done = 0 AND due_ts IS NOT NULL AND due_ts >= ? AND due_ts < ? "
+                "ORDER BY due_ts;",
+                (start, stop),
+            ).fetchall()
+
+    def open_todo(
+        self, todo_id: int
+    ) -> Optional[Tuple[int, str, int, Optional[float]]]:
+        """
+        The to-do with the id, `None` if it is done or deleted.
+        """
+        with self.connect() as conn:
+            return conn.execute(
+                "SELECT id, title, priority, due_ts FROM todos "
+                "WHERE id = ? AND done = 0;",
+                (todo_id,),
+            ).fetchone()
+
+    def set_birthday(
+        self,
+        name: str,
+        month: int,
+        day: int,
+        callback: Optional[Callable[[Optional[int], Optional[Exception]], None]] = None,
+    ) -> None:
+        """
+        Queues saving the birthday of `name`, replacing the old one, see
+        `write`.
+        """
+        self.write(
+            "INSERT OR REPLACE INTO birthdays(name, month, day) VALUES (?, ?, ?);",
+            (name, month, day),
+            callback,
+        )
+
+    def birthdays_on(
+        self, days: Iterable[Tuple[int, int]]
+    ) -> List[Tuple[str, int, int]]:
+        """
+        Looks up whose birthday falls on the days.
+
+        Args:
+            days (Iterable[Tuple[int, int]]): `(month, day)` of the days.
+
+        Returns:
+            List[Tuple[str, int, int]]: `(name, month, day)` of the birthdays.
+        """
+        days = list(days)
+        if not days:
+            return []
+        with self.connect() as conn:
+            return conn.execute(
+                "SELECT name, month, day FROM birthdays WHERE (month, day) IN "
+                f"(VALUES {', '.join(['(?, ?)'] * len(days))});",
+                [number for month_day in days for number in month_day],
+            ).fetchall()
+
+    def add_message(
+        self,
+        from_user: bool,
+        text: str,
+        ts: float,
+        callback: Optional[Callable[[Optional[int], Optional[Exception]], None]] = None,
+    ) -> None:
+        """
+        Queues a chat message to be saved in the history, see `write`. The
+        callback gets the id of the message.
+        """
+        self.write(
+            "INSERT INTO history(from_user, text, unix_ts) VALUES (?, ?, ?);",
+            (int(from_user), text, ts),
+            callback,
+        )
+
+    def history_page(
+        self, before: Optional[int] = None, limit: int = HISTORY_PAGE_SIZE
+    ) -> List[Tuple[int, bool, str, float]]:
+        """
+        Fetches a page of the chat history, the newest message first.
+
+        Args:
+            before (Optional[int]): The id of the oldest message already
+            shown, `None` for the latest messages.
+            limit (int): The most messages to return.
+
+        Returns:
+            List[Tuple[int, bool, str, float]]: `(id, from_user, text,
+            unix_ts)` of the messages.
+        """
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT id, from_user, text, unix_ts FROM history "
+                f"{'' if before is None else 'WHERE id < ?'} "
+                "ORDER BY id DESC LIMIT ?;",
+                (limit,) if before is None else (before, limit),
+            ).fetchall()
+        return [(msg_id, bool(user), text, ts) for msg_id, user, text, ts in rows]
+
+
+class UserStores:
+    """
+    A `Storage` for every user, for when the bot serves more than one. The
+    notes, to-dos, settings and history of each user go in their own file
+    in `folder`, so the users never wait on each other's writes. The
+    places are read from the shared database, attached read-only.
+
+    Every `get` holds the store until it is given back with `release`, or
+    use `use` for the time of a request. Only the `max_open` most recently
+    used stores are kept open, but a store is never closed while it is
+    held, so more are open while more are held. A `ChatBot` holding its
+    store for good keeps it open for good.
+    """
+
+    def __init__(
+        self,
+        folder: str = USERS_DIR,
+        places_path: str = DB_PATH,
+        max_open: int = 8,
+        **options: Any,
+    ) -> None:
+        self.folder = folder
+        self.places_path = places_path
+        self.max_open = max_open
+        # Passed on to every `Storage`, Eg. `pool_size`.
+        self.options = options
+        makedirs(folder, exist_ok=True)
+        # The shared database must be migrated before it is attached.
+        Storage(places_path).close()
+        self._stores: "OrderedDict[str, Storage]" = OrderedDict()
+        # How many times each store was handed out and not released yet.
+        self._holders: Dict[str, int] = {}
+        self._lock = Lock()
+
+    def get(self, user: str) -> Storage:
+        """
+        The store of the user, it is created the first time. It stays open
+        until it is given back with `release`.
+
+        Args:
+            user (str): The user's id, letters, digits, "_", "-" and "."
+            only, as it names the file.
+
+        Returns:
+            Storage: The user's store.
+        """
+        if not USER_re.fullmatch(user):
+            raise ValueError(f"{user!r} can't be used as a user id.")
+        with self._lock:
+            store = self._stores.get(user)
+            if store is not None:
+                self._stores.move_to_end(user)
+                self._holders[user] += 1
+                return store
+        # Opening may migrate a new file, the other users need not wait.
+        store = Storage(
+            join(self.folder, f"{user}.sqlite3"),
+            places_path=self.places_path,
+            **self.options,
+        )
+        with self._lock:
+            if user in self._stores:
+                # Another thread opened it meanwhile.
+                evicted = [store]
+                store = self._stores[user]
+                self._stores.move_to_end(user)
+            else:
+                self._stores[user] = store
+                self._holders[user] = 0
+                evicted = []
+            self._holders[user] += 1
+            evicted += self._evict()
+        for old in evicted:
+            old.close()
+        return store
+
+    def release(self, user: str) -> None:
+        """
+        Gives back a store from `get`, it may be closed once no one holds
+        it.
+        """
+        with self._lock:
+            if not self._holders.get(user):
+                raise ValueError(f"The store of {user!r} is not held.")
+            self._holders[user] -= 1
+            evicted = self._evict()
+        for old in evicted:
+            old.close()
+
+    @contextmanager
+    def use(self, user: str) -> Iterator[Storage]:
+        """
+        The store of the user, held for the `with` block.
+        """
+        store = self.get(user)
+        try:
+            yield store
+        finally:
+            self.release(user)
+
+    def _evict(self) -> List[Storage]:
+        # The least recently used stores no one holds, while there are more
+        # than `max_open`. To be closed by the caller, outside the lock.
+        evicted = []
+        for user in list(self._stores):
+            if len(self._stores) <= self.max_open:
+                break
+            if not self._holders[user]:
+                evicted.append(self._stores.pop(user))
+                del self._holders[user]
+        return evicted
+
+    def close(self) -> None:
+        """
+        Closes all the open stores, held or not.
+        """
+        with self._lock:
+            stores, self._stores = list(self._stores.values()), OrderedDict()
+            self._holders = {}
+        for store in stores:
+            store.close()
+
+
+def todo_key(todo: Tuple[int, str, int, Optional[float]]) -> Tuple[int, float, int]:
+    """
+    The position of a to-do from `Storage.todos_page` in the list order,
+    to fetch the page after it.
+    """
+    todo_id, _, priority, due_ts = todo
+    return priority, float("inf") if due_ts is None else due_ts, todo_id
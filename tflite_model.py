@@ -0,0 +1,92 @@
+"""
+The model converted to TensorFlow Lite. Keras's `predict` sets up a whole
+data pipeline for every call, which is most of the time it takes for the one
+row of a message, the TFLite interpreter only runs the layers.
+
+Run `python -m tflite_model` after training to convert `MODEL_PATH`, and
+start the app with `TENSORBOT_MODEL=tflite` to use it. The interpreter of
+`tflite_runtime` is used when that is installed, TensorFlow's otherwise.
+"""
+
+from os import environ
+from os.path import exists
+from threading import Lock
+import numpy as np
+from vocab import MODEL_PATH, file_sha256
+
+TFLITE_PATH = "data/TensorBot_v2.tflite"
+# The model is small, the threads cost more to start than they save. Raise
+# it with `TENSORBOT_TFLITE_THREADS` for a much larger vocabulary.
+TFLITE_THREADS = int(environ.get("TENSORBOT_TFLITE_THREADS", 1))
+
+
+def convert(model_path: str = MODEL_PATH, path: str = TFLITE_PATH) -> None:
+    """
+    Converts the Keras model at `model_path` and writes it to `path`, with
+    the hash of the Keras model next to it in `path` + ".sha256".
+    """
+    from tensorflow.keras.models import load_model
+    from tensorflow.lite import TFLiteConverter
+
+    flatbuffer = TFLiteConverter.from_keras_model(load_model(model_path)).convert()
+    with open(path, "wb") as file:
+        file.write(flatbuffer)
+    # A flatbuffer has no room for it, unlike the npz of `quantize`.
+    with open(path + ".sha256", "w") as file:
+        file.write(file_sha256(model_path))
+
+
+class TFLiteModel:
+    """
+    Runs a model written by `convert`. The input and output tensors are
+    allocated once for a batch size and reused, they are only allocated again
+    when a batch of another size comes. `predict` takes and returns the same
+    as Keras's. `model_sha256` is the hash of the Keras model it was
+    converted from, `None` for a file converted before it was kept.
+
+    Args:
+        path (str): The `.tflite` file.
+        threads (int): The threads the interpreter may use for a call.
+    """
+
+    def __init__(self, path: str = TFLITE_PATH, threads: int = TFLITE_THREADS) -> None:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+
+        self.model_sha256 = None
+        if exists(path + ".sha256"):
+            with open(path + ".sha256") as file:
+                self.model_sha256 = file.read().strip()
+        self._interpreter = Interpreter(model_path=path, num_threads=threads)
+        self._interpreter.allocate_tensors()
+        self._input_index = self._interpreter.get_input_details()[0]["index"]
+        self._output_index = self._interpreter.get_output_details()[0]["index"]
+        self._input = self._interpreter.tensor(self._input_index)
+        self._output = self._interpreter.tensor(self._output_index)
+        self._rows = self._input().shape[0]
+        # One interpreter can't run two calls at once, and a message can be
+        # answered while the warm-up or another message still runs.
+        self._lock = Lock()
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        """
+        The output of the model for each row of the batch.
+        """
+        with self._lock:
+            if len(batch) != self._rows:
+                shape = (len(batch), *self._input().shape[1:])
+                self._interpreter.resize_tensor_input(self._input_index, shape)
+                self._interpreter.allocate_tensors()
+                self._rows = len(batch)
+            # Written into the interpreter's own buffer, and read back out of
+            # it. The views must not be kept over a call of `invoke`.
+            self._input()[...] = batch
+            self._interpreter.invoke()
+            return self._output().copy()
+
+
+if __name__ == "__main__":
+    convert()
+    print(f"Wrote {TFLITE_PATH}.")
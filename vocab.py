@@ -0,0 +1,208 @@
+"""
+The vocabulary and the intent labels the model was trained with, in one
+binary file that is memory-mapped instead of unpickled. Opening it creates
+no Python object per word, the lookups read the mapped pages straight away,
+so it opens at once and processes running the bot share the pages.
+
+The file, all numbers little-endian `uint32`:
+
+    header          magic, version, word count, class count, table size
+                    and the SHA-256 of the model file it belongs to
+    word ends       word count + 1 offsets into the words blob
+    hash table      table size slots, a word index + 1 or 0 when empty
+    class ends      class count + 1 offsets into the classes blob
+    words blob      the sorted words, UTF-8
+    classes blob    the class labels in the model's output order, UTF-8
+
+Build it with `write_vocab`, the training notebook does after saving the
+model. Running this module converts an old `chatbot_dump_v2.pkl`.
+"""
+
+import sys
+from array import array
+from hashlib import sha256
+from itertools import accumulate
+from mmap import ACCESS_READ, mmap
+from os import replace
+from os.path import exists
+from pickle import load as pkload
+from struct import Struct
+from typing import List, Optional
+
+VOCAB_PATH = "data/chatbot_vocab_v2.bin"
+VOCAB_PICKLE_PATH = "data/chatbot_dump_v2.pkl"
+MODEL_PATH = "data/TensorBot_v2.h5"
+VOCAB_VERSION = 1
+_HEADER = Struct("<8sIIII32s")
+_MAGIC = b"TBVOCAB\0"
+
+
+def _fnv1a(data: bytes) -> int:
+    # A fixed hash, Python's own `hash` of a str changes every run.
+    h = 0x811C9DC5
+    for byte in data:
+        h = ((h ^ byte) * 0x01000193) & 0xFFFFFFFF
+    return h
+
+
+def file_sha256(path: str) -> str:
+    """
+    The hex SHA-256 of a file's content.
+    """
+    digest = sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _uint32s(values) -> array:
+    numbers = array("I", values)
+    if sys.byteorder == "big":
+        numbers.byteswap()
+    return numbers
+
+
+def _blob(texts: List[str]) -> tuple:
+    encoded = [text.encode("utf-8") for text in texts]
+    ends = _uint32s(accumulate((len(text) for text in encoded), initial=0))
+    return ends, b"".join(encoded)
+
+
+def write_vocab(
+    path: str, words: List[str], classes: List[str], model_path: str = MODEL_PATH
+) -> None:
+    """
+    Writes the vocabulary file, see the module docstring. The file is
+    written next to `path` first and moved over it, so a running bot never
+    maps a half written file.
+
+    Args:
+        path (str): Where to write it.
+        words (List[str]): The stemmed words, in the order of the model's
+        inputs. They are sorted in training already.
+        classes (List[str]): The intent names, in the order of the model's
+        outputs.
+        model_path (str): The model the vocabulary was trained with.
+    """
+    word_ends, word_blob = _blob(words)
+    class_ends, class_blob = _blob(classes)
+    # A table at most half full, so a miss ends within a probe or two.
+    size = 1
+    while size < 2 * len(words):
+        size *= 2
+    table = [0] * size
+    for index, word in enumerate(words):
+        data = word.encode("utf-8")
+        slot = _fnv1a(data) & (size - 1)
+        while table[slot]:
+            slot = (slot + 1) & (size - 1)
+        table[slot] = index + 1
+    table = _uint32s(table)
+    header = _HEADER.pack(
+        _MAGIC,
+        VOCAB_VERSION,
+        len(words),
+        len(classes),
+        size,
+        bytes.fromhex(file_sha256(model_path)),
+    )
+    with open(path + ".tmp", "wb") as file:
+        for part in (header, word_ends, table, class_ends, word_blob, class_blob):
+            file.write(part)
+    replace(path + ".tmp", path)
+
+
+class Vocab:
+    """
+    A vocabulary file opened with `mmap`. `index` finds a word's position
+    in the model's inputs, `label` gives the intent name of an output.
+    """
+
+    def __init__(self, path: str = VOCAB_PATH) -> None:
+        with open(path, "rb") as file:
+            self._map = mmap(file.fileno(), 0, access=ACCESS_READ)
+        magic, version, words, classes, size, model = _HEADER.unpack_from(self._map)
+        if magic != _MAGIC or version != VOCAB_VERSION:
+            raise ValueError(f"{path} is not a version {VOCAB_VERSION} vocabulary.")
+        self.model_sha256 = model.hex()
+        self._mask = size - 1
+        # Views into the mapped file, nothing is copied. On a big-endian
+        # machine the numbers have to be copied and swapped though.
+        pos = _HEADER.size
+        self._word_ends = self._uint32s(pos, words + 1)
+        pos += 4 * (words + 1)
+        self._table = self._uint32s(pos, size)
+        pos += 4 * size
+        self._class_ends = self._uint32s(pos, classes + 1)
+        pos += 4 * (classes + 1)
+        self._words_at = pos
+        self._classes_at = pos + self._word_ends[-1]
+
+    def _uint32s(self, pos: int, count: int):
+        view = memoryview(self._map)[pos : pos + 4 * count].cast("I")
+        if sys.byteorder == "big":
+            view = array("I", view)
+            view.byteswap()
+        return view
+
+    def __len__(self) -> int:
+        return len(self._word_ends) - 1
+
+    def __contains__(self, word: str) -> bool:
+        return self.index(word) is not None
+
+    @property
+    def class_count(self) -> int:
+        return len(self._class_ends) - 1
+
+    def index(self, word: str) -> Optional[int]:
+        """
+        The position of the word in the model's inputs, `None` if the model
+        doesn't know it.
+        """
+        data = word.encode("utf-8")
+        slot = _fnv1a(data) & self._mask
+        while True:
+            found = self._table[slot]
+            if not found:
+                return None
+            start = self._words_at + self._word_ends[found - 1]
+            end = self._words_at + self._word_ends[found]
+            if self._map[start:end] == data:
+                return found - 1
+            slot = (slot + 1) & self._mask
+
+    def word(self, index: int) -> str:
+        start, end = self._word_ends[index : index + 2]
+        return self._map[self._words_at + start : self._words_at + end].decode("utf-8")
+
+    def label(self, index: int) -> str:
+        """
+        The intent name of the model's output at `index`.
+        """
+        start, end = self._class_ends[index : index + 2]
+        return self._map[self._classes_at + start : self._classes_at + end].decode(
+            "utf-8"
+        )
+
+
+def open_vocab(
+    path: str = VOCAB_PATH,
+    pickle_path: str = VOCAB_PICKLE_PATH,
+    model_path: str = MODEL_PATH,
+) -> Vocab:
+    """
+    Opens the vocabulary, building it once from the old pickle of
+    `(words, classes)` if there is only that.
+    """
+    if not exists(path) and exists(pickle_path):
+        with open(pickle_path, "rb") as file:
+            words, classes = pkload(file)
+        write_vocab(path, words, classes, model_path)
+    return Vocab(path)
+
+
+if __name__ == "__main__":
+    vocab = open_vocab()
+    print(f"{VOCAB_PATH}: {len(vocab)} words, {vocab.class_count} classes.")